@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from flask_cors import cross_origin
 from flask_mail import Mail, Message
 from flask_sqlalchemy import SQLAlchemy
@@ -8,18 +8,44 @@ import numpy as np
 from PIL import Image
 import io
 import os
+import sys
 import tempfile
 import base64
+import time
+import threading
 import cv2
 from pathlib import Path
-from tts_manager import TTSManager
+from db_config import SQLiteTuning
+from tts_jobs import TTSJobQueue, MAX_JOB_TEXT_LENGTH
+from video_search import VideoFaceSearch
+from audio_encoding import AUDIO_FORMATS, DEFAULT_AUDIO_FORMAT, validate_audio_options
+from tts_planner import TTSPlanner, CostEstimator, AdmissionError
+from rate_limit import RateLimiter, EndpointLimit, rate_limited
+from singleflight import SingleFlight, SingleFlightTimeout
 
 app = Flask(__name__)
 
+# Set AI_SERVICES_STUB_MODELS=1 to serve with fake models (see stub_backends.py), e.g. for load tests
+USE_STUB_MODELS = os.getenv('AI_SERVICES_STUB_MODELS', '0') == '1'
+
 # Flask-SQLAlchemy configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db' # Using SQLite database
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///site.db') # Using SQLite database
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+# SQLite connection tuning (WAL, synchronous mode, busy timeout, pool size, read-only read connections)
+sqlite_tuning = None
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite:'):
+    sqlite_tuning = SQLiteTuning.from_env()
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_tuning.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 db = SQLAlchemy(app)
+if sqlite_tuning is not None:
+    sqlite_tuning.attach(app, db)
+
+def read_session():
+    """Session for read-only queries: the read-only connection pool if enabled, else db.session."""
+    if sqlite_tuning is not None and sqlite_tuning.read_session is not None:
+        return sqlite_tuning.read_session
+    return db.session
 
 # Flask-Login configuration
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'a_very_secret_key_for_dev') # Change in production!
@@ -60,6 +86,35 @@ class ServiceRequest(db.Model):
     def __repr__(self):
         return f"ServiceRequest('{self.service_type}', '{self.timestamp}')"
 
+class FaceEmbedding(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    service_request_id = db.Column(db.Integer, db.ForeignKey('service_request.id'), index=True)
+    image_name = db.Column(db.String(255))
+    embedding = db.Column(db.LargeBinary, nullable=False) # SFace features as float16 (256 bytes)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+
+    def __repr__(self):
+        return f"FaceEmbedding('{self.id}', '{self.image_name}')"
+
+class TTSJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True) # queued, running, completed, failed
+    voice = db.Column(db.String(50), nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    segments = db.Column(db.Text, nullable=False) # JSON list of segment texts
+    segments_total = db.Column(db.Integer, nullable=False)
+    segments_done = db.Column(db.Integer, nullable=False, default=0)
+    claimed_by = db.Column(db.Integer) # pid of the worker process holding the current segment
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=db.func.now())
+    updated_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f"TTSJob('{self.id}', '{self.status}', {self.segments_done}/{self.segments_total})"
+
 # Create database tables if they don't exist
 with app.app_context():
     db.create_all()
@@ -74,29 +129,127 @@ app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME', 'your-email@gmail
 
 mail = Mail(app)
 
+# Optional offline model bundle (built with model_bundle.py); MODEL_BUNDLE_VERIFY is size, full or none
+model_bundle = None
+if os.getenv('MODEL_BUNDLE') and not USE_STUB_MODELS:
+    # huggingface_hub reads HF_HUB_OFFLINE once at import, so this must happen before kokoro is imported
+    if 'huggingface_hub' in sys.modules:
+        print("WARNING: huggingface_hub was imported before the model bundle was configured; offline mode is not enforced")
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    from model_bundle import ModelBundle
+    model_bundle = ModelBundle.load(os.getenv('MODEL_BUNDLE'), verify=os.getenv('MODEL_BUNDLE_VERIFY', 'size'))
+
 # Initialize TTS manager
 print("Initializing TTS manager...")
-tts_manager = TTSManager()
+if USE_STUB_MODELS:
+    from stub_backends import StubTTSManager
+    tts_manager = StubTTSManager.from_env()
+else:
+    from tts_manager import TTSManager
+    tts_manager = TTSManager(bundle=model_bundle)
 if not tts_manager.is_available():
     print("WARNING: TTS model failed to initialize. Voice cloning will not be available.")
 else:
     print("TTS model initialized successfully")
 
+# Admission control: estimate synthesis cost from phoneme count and enforce request/user budgets (seconds).
+# Synchronous requests get a much smaller character cap than jobs so oversized text never reaches G2P.
+TTS_MAX_CHARS = int(os.getenv('TTS_MAX_CHARS', '10000'))
+TTS_JOB_MAX_SECONDS = float(os.getenv('TTS_JOB_MAX_SECONDS', '3600'))
+tts_planner = TTSPlanner(
+    phonemizer=getattr(tts_manager, 'count_phonemes', None),
+    estimator=CostEstimator(seconds_per_phoneme=float(os.getenv('TTS_SECONDS_PER_PHONEME', '0.015'))),
+    max_request_seconds=float(os.getenv('TTS_MAX_REQUEST_SECONDS', '60')),
+    user_budget_seconds=float(os.getenv('TTS_USER_BUDGET_SECONDS', '3600')),
+    budget_window=float(os.getenv('TTS_BUDGET_WINDOW', '3600')),
+    max_chars=MAX_JOB_TEXT_LENGTH,
+)
+
+def admission_error_response(error):
+    response = jsonify({'error': str(error)})
+    response.status_code = error.status_code
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+# Per-user rate limiting for the inference endpoints. Costs are in units of TTS_COST_CHARS characters
+# of text or RATE_COST_BYTES bytes of upload. Override a limit with RATE_LIMIT_<NAME>="capacity,refill_per_second,max_in_flight".
+TTS_COST_CHARS = 100
+TTS_JOB_COST_CHARS = 1000
+RATE_COST_BYTES = 1024 * 1024
+
+def _endpoint_limit(name, capacity, refill_rate, max_in_flight):
+    override = os.getenv(f"RATE_LIMIT_{name.upper().replace('-', '_')}")
+    if override:
+        capacity, refill_rate, max_in_flight = override.split(',')
+    return EndpointLimit(float(capacity), float(refill_rate), max_in_flight=int(max_in_flight))
+
+rate_limiter = RateLimiter({
+    'tts': _endpoint_limit('tts', 50, 0.5, 2),
+    'tts-job': _endpoint_limit('tts-job', 200, 0.05, 2),
+    'face': _endpoint_limit('face', 20, 0.5, 2),
+    'face-video': _endpoint_limit('face-video', 200, 0.1, 1),
+})
+
+def tts_request_cost():
+    return len(request.form.get('text', '')) / TTS_COST_CHARS
+
+def tts_job_request_cost():
+    return len(request.form.get('text', '')) / TTS_JOB_COST_CHARS
+
+def upload_request_cost():
+    # Content-Length only, so the upload is neither parsed nor decoded for a rejected request
+    return (request.content_length or 0) / RATE_COST_BYTES
+
+# Concurrent /api/tts requests for the same text, voice and output options share one synthesis.
+# Requests that join one give up after TTS_COALESCE_TIMEOUT seconds.
+TTS_COALESCE_TIMEOUT = float(os.getenv('TTS_COALESCE_TIMEOUT', '120'))
+tts_singleflight = SingleFlight()
+
+# Background queue for long TTS jobs. Interrupted jobs resume when the workers start.
+# Under pre-fork serving the workers are started in each forked process instead (see prefork.py).
+app.config['TTS_JOBS_DIR'] = os.getenv('TTS_JOBS_DIR', os.path.join(app.instance_path, 'tts_jobs'))
+tts_job_queue = TTSJobQueue(
+    app, db, TTSJob, tts_manager, app.config['TTS_JOBS_DIR'],
+    workers=int(os.getenv('TTS_JOB_WORKERS', '1')),
+    on_segment=tts_planner.record_chunk,
+)
+if os.getenv('AI_SERVICES_PREFORK') != '1':
+    tts_job_queue.start()
+
 # Load face detection and recognition models
 FACE_DETECTION_MODEL = os.path.join('models', 'face_detection_yunet_2023mar.onnx')
 FACE_RECOGNITION_MODEL = os.path.join('models', 'face_recognition_sface_2021dec.onnx')
+if model_bundle is not None:
+    FACE_DETECTION_MODEL = model_bundle.face_model_path('detection')
+    FACE_RECOGNITION_MODEL = model_bundle.face_model_path('recognition')
 
 try:
-    face_detector = cv2.FaceDetectorYN.create(
-        FACE_DETECTION_MODEL, "", (320, 320), 0.8, 0.3, 5000
-    )
-    face_recognizer = cv2.FaceRecognizerSF.create(FACE_RECOGNITION_MODEL, "")
+    if USE_STUB_MODELS:
+        from stub_backends import create_face_models_from_env
+        face_detector, face_recognizer = create_face_models_from_env()
+    else:
+        face_detector = cv2.FaceDetectorYN.create(
+            FACE_DETECTION_MODEL, "", (320, 320), 0.8, 0.3, 5000
+        )
+        face_recognizer = cv2.FaceRecognizerSF.create(FACE_RECOGNITION_MODEL, "")
     print("Successfully loaded face detection and recognition models")
 except Exception as e:
     print(f"Error loading models: {str(e)}")
     face_detector = None
     face_recognizer = None
 
+# SFace match thresholds (from the OpenCV face recognition sample)
+L2_THRESHOLD = 1.128
+COSINE_THRESHOLD = 0.363
+
+# Upper bound on frames processed per video search (10 minutes at 30 fps)
+MAX_VIDEO_FRAMES = 18000
+
+# OpenCV DNN models are not thread-safe (and the detector's input size is shared state),
+# so inference is serialized when requests are served from multiple threads
+face_model_lock = threading.Lock()
+
 def preprocess_image(img):
     # Resize large images while maintaining aspect ratio
     max_dimension = 1500
@@ -114,9 +267,10 @@ def detect_faces(image):
     if face_detector is None:
         raise Exception("Face detector model not loaded")
     
-    # Set input size for the face detector
-    face_detector.setInputSize((image.shape[1], image.shape[0]))
-    faces = face_detector.detect(image)
+    with face_model_lock:
+        # Set input size for the face detector
+        face_detector.setInputSize((image.shape[1], image.shape[0]))
+        faces = face_detector.detect(image)
     return faces
 
 def extract_features(image, faces):
@@ -126,8 +280,9 @@ def extract_features(image, faces):
     if faces[1] is None or len(faces[1]) == 0:
         return None
     
-    face_align = face_recognizer.alignCrop(image, faces[1][0])
-    face_features = face_recognizer.feature(face_align)
+    with face_model_lock:
+        face_align = face_recognizer.alignCrop(image, faces[1][0])
+        face_features = face_recognizer.feature(face_align)
     return face_features
 
 def compare_faces(features1, features2):
@@ -151,57 +306,73 @@ def compare_faces(features1, features2):
         'cosine_score': float(cosine_score)
     }
 
+def embedding_to_bytes(features):
+    """Pack SFace features compactly as float16 for storage."""
+    return np.asarray(features, dtype=np.float16).tobytes()
+
+def embedding_from_bytes(data):
+    return np.frombuffer(data, dtype=np.float16).astype(np.float32).reshape(1, -1)
+
+def get_user_face_features(embedding_id):
+    """Stored features for one of the current user's faces, or None if there is no such face."""
+    try:
+        embedding_id = int(embedding_id)
+    except (TypeError, ValueError):
+        return None
+    face_embedding = db.session.get(FaceEmbedding, embedding_id)
+    if face_embedding is None or face_embedding.user_id != current_user.id:
+        return None
+    return embedding_from_bytes(face_embedding.embedding)
+
 @app.route('/api/face-detection', methods=['POST'])
 @login_required
 @cross_origin(origins="http://localhost:3000", methods=["POST", "OPTIONS"], supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
+@rate_limited(rate_limiter, 'face', upload_request_cost)
 def face_detection():
     try:
         print("Received face detection request")
-        if 'image1' not in request.files or 'image2' not in request.files:
-            return jsonify({'error': 'Both images are required'}), 400
-
-        image1 = request.files['image1']
-        image2 = request.files['image2']
-        
-        print(f"Received images: image1={image1.filename}, image2={image2.filename}")
-        
-        # Read images
-        img1 = cv2.imdecode(np.frombuffer(image1.read(), np.uint8), cv2.IMREAD_COLOR)
-        img2 = cv2.imdecode(np.frombuffer(image2.read(), np.uint8), cv2.IMREAD_COLOR)
+        # Each side is either a new upload (imageN) or the id of a face stored earlier (imageN_id)
+        features, uploads = {}, {}
+        for side in ('image1', 'image2'):
+            embedding_id = request.form.get(f'{side}_id')
+            if embedding_id:
+                features[side] = get_user_face_features(embedding_id)
+                if features[side] is None:
+                    return jsonify({'error': f'Stored face {embedding_id} not found'}), 404
+            elif side in request.files:
+                uploads[side] = request.files[side]
+            else:
+                return jsonify({'error': 'Both images are required'}), 400
         
-        if img1 is None or img2 is None:
-            return jsonify({'error': 'Failed to read one or both images'}), 400
-            
-        print(f"Image shapes: img1={img1.shape}, img2={img2.shape}")
-        
-        # Preprocess images
-        img1 = preprocess_image(img1)
-        img2 = preprocess_image(img2)
+        print("Received images: " + ', '.join(f'{side}={upload.filename}' for side, upload in uploads.items()))
         
-        # Detect faces
-        faces1 = detect_faces(img1)
-        faces2 = detect_faces(img2)
+        # Read and preprocess the uploaded images, then detect faces
+        images, faces = {}, {}
+        for side, upload in uploads.items():
+            img = cv2.imdecode(np.frombuffer(upload.read(), np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                return jsonify({'error': 'Failed to read one or both images'}), 400
+            print(f"Image shape: {side}={img.shape}")
+            images[side] = preprocess_image(img)
+            faces[side] = detect_faces(images[side])
         
-        print(f"Detected faces: faces1={bool(faces1)}, faces2={bool(faces2)}")
+        print("Detected faces: " + ', '.join(f'{side}={bool(found)}' for side, found in faces.items()))
         
-        if not faces1 or not faces2:
+        if not all(faces.values()):
             return jsonify({'error': 'No faces found in one or both images'}), 400
         
         # Extract features
-        features1 = extract_features(img1, faces1)
-        features2 = extract_features(img2, faces2)
+        for side in uploads:
+            features[side] = extract_features(images[side], faces[side])
         
-        if features1 is None or features2 is None:
+        if any(side_features is None for side_features in features.values()):
             return jsonify({'error': 'Could not extract features from faces'}), 400
         
         # Compare faces
-        scores = compare_faces(features1, features2)
+        scores = compare_faces(features['image1'], features['image2'])
         
         # Determine match based on thresholds
-        l2_threshold = 1.128
-        cosine_threshold = 0.363
-        
-        is_match = (scores['l2_score'] <= l2_threshold) and (scores['cosine_score'] >= cosine_threshold)
+        is_match = (scores['l2_score'] <= L2_THRESHOLD) and (scores['cosine_score'] >= COSINE_THRESHOLD)
         
         result = {
             'match': bool(is_match),
@@ -213,20 +384,40 @@ def face_detection():
         
         print(f"Comparison result: {result}")
 
-        # Log the request if user is logged in
+        # Log the request if user is logged in, keeping the new embeddings so that later
+        # comparisons can reference these images by id instead of uploading them again
         if current_user.is_authenticated:
             try:
                 request_log = ServiceRequest(
                     user_id=current_user.id,
-                    service_type='face-detection',
-                    result_data=jsonify(result).get_data(as_text=True) # Store result as JSON string
+                    service_type='face-detection'
                 )
                 db.session.add(request_log)
+                db.session.flush()
+
+                face_ids = {}
+                for side in ('image1', 'image2'):
+                    if side in uploads:
+                        face_embedding = FaceEmbedding(
+                            user_id=current_user.id,
+                            service_request_id=request_log.id,
+                            image_name=(uploads[side].filename or '')[:255],
+                            embedding=embedding_to_bytes(features[side])
+                        )
+                        db.session.add(face_embedding)
+                        db.session.flush()
+                        face_ids[side] = face_embedding.id
+                    else:
+                        face_ids[side] = int(request.form[f'{side}_id'])
+                result['face_ids'] = face_ids
+
+                request_log.result_data = jsonify(result).get_data(as_text=True) # Store result as JSON string
                 db.session.commit()
                 print("Face detection request logged for user: ", current_user.username)
             except Exception as log_error:
                 print(f"Error logging face detection request: {str(log_error)}")
                 db.session.rollback() # Rollback log entry if it fails
+                result.pop('face_ids', None)
 
         return jsonify(result)
         
@@ -249,9 +440,130 @@ def face_detection():
 
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/faces', methods=['GET'])
+@login_required
+@cross_origin(origins="http://localhost:3000", methods=["GET", "OPTIONS"], supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
+def list_faces():
+    """List the current user's stored faces, usable as image1_id/image2_id/reference_id."""
+    try:
+        face_embeddings = read_session().execute(
+            db.select(FaceEmbedding).filter_by(user_id=current_user.id).order_by(FaceEmbedding.created_at.desc())
+        ).scalars().all()
+        return jsonify([{
+            'id': face_embedding.id,
+            'image_name': face_embedding.image_name,
+            'service_request_id': face_embedding.service_request_id,
+            'created_at': face_embedding.created_at.isoformat()
+        } for face_embedding in face_embeddings]), 200
+    except Exception as e:
+        print(f"Error fetching stored faces: {str(e)}")
+        return jsonify({'error': 'Failed to fetch stored faces', 'details': str(e)}), 500
+
+@app.route('/api/faces/<int:face_id>', methods=['DELETE'])
+@login_required
+@cross_origin(origins="http://localhost:3000", methods=["DELETE", "OPTIONS"], supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
+def delete_face(face_id):
+    face_embedding = db.session.get(FaceEmbedding, face_id)
+    if face_embedding is None or face_embedding.user_id != current_user.id:
+        return jsonify({'error': 'Stored face not found'}), 404
+    db.session.delete(face_embedding)
+    db.session.commit()
+    return jsonify({'message': 'Stored face deleted'}), 200
+
+def extract_face_row_features(image, face):
+    """Features for one specific detected face (a single YuNet output row)."""
+    return extract_features(image, (1, face[np.newaxis]))
+
+@app.route('/api/face-search/video', methods=['POST'])
+@login_required
+@cross_origin(origins="http://localhost:3000", methods=["POST", "OPTIONS"], supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
+@rate_limited(rate_limiter, 'face-video', upload_request_cost)
+def face_search_video():
+    """Find where the face in a reference image appears in an uploaded video."""
+    video_path = None
+    try:
+        reference_id = request.form.get('reference_id')
+        if 'video' not in request.files or ('reference' not in request.files and not reference_id):
+            return jsonify({'error': 'A reference image (or reference_id) and a video are required'}), 400
+
+        try:
+            detect_every = int(request.form.get('detect_every', 10))
+            scene_threshold = float(request.form.get('scene_threshold', 0.4))
+            max_frames = int(request.form.get('max_frames', MAX_VIDEO_FRAMES))
+        except ValueError:
+            return jsonify({'error': 'Invalid search parameters'}), 400
+
+        if reference_id:
+            reference_features = get_user_face_features(reference_id)
+            if reference_features is None:
+                return jsonify({'error': f'Stored face {reference_id} not found'}), 404
+        else:
+            reference = cv2.imdecode(np.frombuffer(request.files['reference'].read(), np.uint8), cv2.IMREAD_COLOR)
+            if reference is None:
+                return jsonify({'error': 'Failed to read the reference image'}), 400
+
+            reference = preprocess_image(reference)
+            reference_faces = detect_faces(reference)
+            reference_features = extract_features(reference, reference_faces) if reference_faces else None
+            if reference_features is None:
+                return jsonify({'error': 'No face found in the reference image'}), 400
+
+        # cv2.VideoCapture needs a file path
+        video = request.files['video']
+        suffix = Path(video.filename or '').suffix or '.mp4'
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+            video.save(f)
+            video_path = f.name
+
+        search = VideoFaceSearch(
+            detect_faces, extract_face_row_features, compare_faces,
+            detect_every=detect_every, scene_threshold=scene_threshold,
+        )
+        result = search.search(video_path, reference_features, L2_THRESHOLD, COSINE_THRESHOLD,
+                               max_frames=min(max_frames, MAX_VIDEO_FRAMES))
+
+        try:
+            request_log = ServiceRequest(
+                user_id=current_user.id,
+                service_type='face-video-search',
+                result_data=jsonify({'matches': result['matches'], 'frames': result['stats']['frames']}).get_data(as_text=True)
+            )
+            db.session.add(request_log)
+            if reference_id:
+                result['reference_id'] = int(reference_id)
+            else:
+                # Keep the new reference embedding so later searches can pass it as reference_id
+                db.session.flush()
+                face_embedding = FaceEmbedding(
+                    user_id=current_user.id,
+                    service_request_id=request_log.id,
+                    image_name=(request.files['reference'].filename or '')[:255],
+                    embedding=embedding_to_bytes(reference_features)
+                )
+                db.session.add(face_embedding)
+                db.session.flush()
+                result['reference_id'] = face_embedding.id
+            db.session.commit()
+        except Exception as log_error:
+            print(f"Error logging video face search request: {str(log_error)}")
+            db.session.rollback()
+            result.pop('reference_id', None)
+
+        return jsonify(result)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in video face search: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if video_path and os.path.exists(video_path):
+            os.unlink(video_path)
+
 @app.route('/api/voice-clone', methods=['POST'])
 @login_required
 @cross_origin(origins="http://localhost:3000", methods=["POST", "OPTIONS"], supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
+@rate_limited(rate_limiter, 'tts', tts_request_cost)
 def voice_clone():
     if not tts_manager.is_available():
         # Log error if user is logged in and TTS is unavailable
@@ -281,17 +593,68 @@ def voice_clone():
 
         if not text_to_speak:
             return jsonify({'error': 'No text provided'}), 400
+
+        # Output encoding options: format (wav, flac, ogg, opus), sample_rate, compression_level, bitrate_mode
+        audio_format = request.form.get('format', DEFAULT_AUDIO_FORMAT).lower()
+        try:
+            sample_rate = int(request.form['sample_rate']) if request.form.get('sample_rate') else None
+            compression_level = float(request.form['compression_level']) if request.form.get('compression_level') else None
+            bitrate_mode = request.form.get('bitrate_mode', '').upper() or None
+            validate_audio_options(audio_format, sample_rate, compression_level, bitrate_mode)
+        except ValueError as e:
+            return jsonify({'error': 'Invalid audio options', 'details': str(e)}), 400
+
+        # Normalize and cost the text, and refuse it before synthesis if it is over budget
+        try:
+            plan = tts_planner.plan(current_user.id, text_to_speak, max_chars=TTS_MAX_CHARS)
+        except AdmissionError as e:
+            return admission_error_response(e)
+        if not plan.chunks:
+            # Nothing speakable was left after normalization, e.g. only control characters
+            tts_planner.refund(plan)
+            return jsonify({'error': 'No text provided'}), 400
             
-        # Create temporary file for output
-        output_path = tempfile.mktemp(suffix='.wav')
-        
+        def synthesize():
+            # Create temporary file for output
+            output_path = tempfile.mktemp(suffix=AUDIO_FORMATS[audio_format][3])
+            try:
+                # Generate speech, encoding each chunk as it is produced. Kokoro treats each line as a unit,
+                # so the planned chunks are passed one per line.
+                synthesis_started = time.perf_counter()
+                audio_info = tts_manager.generate_speech(
+                    '\n'.join(plan.chunks), output_path, voice=voice_option, audio_format=audio_format,
+                    sample_rate=sample_rate, compression_level=compression_level, bitrate_mode=bitrate_mode,
+                )
+                synthesis_seconds = time.perf_counter() - synthesis_started
+
+                # Read the generated audio
+                with open(output_path, 'rb') as f:
+                    return f.read(), audio_info, synthesis_seconds
+            finally:
+                # Clean up temporary file
+                if os.path.exists(output_path):
+                    os.unlink(output_path)
+
+        # Identical requests already being synthesized are joined rather than synthesized again
+        coalesce_key = (plan.text, voice_option, audio_format, sample_rate, compression_level, bitrate_mode)
         try:
-            # Generate speech
-            tts_manager.generate_speech(text_to_speak, output_path, voice=voice_option)
+            (audio_data, audio_info, synthesis_seconds), coalesced = tts_singleflight.do(
+                coalesce_key, synthesize, timeout=TTS_COALESCE_TIMEOUT
+            )
+            if coalesced:
+                tts_planner.refund(plan)
+            else:
+                tts_planner.record(plan, synthesis_seconds)
+        except SingleFlightTimeout as timeout_error:
+            tts_planner.refund(plan)
+            print(f"Timed out waiting for coalesced TTS request: {str(timeout_error)}")
+            return jsonify({
+                'error': 'Timed out waiting for speech generation',
+                'details': str(timeout_error)
+            }), 504
         except Exception as tts_error:
+            tts_planner.refund(plan)
             print(f"Error during TTS generation: {str(tts_error)}")
-            if os.path.exists(output_path):
-                os.unlink(output_path)
 
             # Log TTS generation error if user is logged in
             if current_user.is_authenticated:
@@ -313,14 +676,8 @@ def voice_clone():
                 'details': str(tts_error)
             }), 500
         
-        # Read the generated audio and encode as base64
-        with open(output_path, 'rb') as f:
-            audio_data = f.read()
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
-        # Clean up temporary file
-        if os.path.exists(output_path):
-            os.unlink(output_path)
+        # Encode the audio as base64
+        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
 
         # Log the successful request if user is logged in
         if current_user.is_authenticated:
@@ -328,7 +685,10 @@ def voice_clone():
                  request_log = ServiceRequest(
                      user_id=current_user.id,
                      service_type='text-to-speech',
-                     result_data=f'Text: {text_to_speak[:100]}..., Voice: {voice_option}' # Log first 100 chars and voice
+                     # Log first 100 chars, voice, and predicted vs. actual synthesis time
+                     result_data=f'Text: {text_to_speak[:100]}..., Voice: {voice_option}, '
+                                 f'Predicted: {plan.predicted_seconds:.1f}s, Actual: {synthesis_seconds:.1f}s'
+                                 + (' (coalesced)' if coalesced else '')
                  )
                  db.session.add(request_log)
                  db.session.commit()
@@ -339,6 +699,11 @@ def voice_clone():
 
         return jsonify({
             'audio': audio_base64,
+            'coalesced': coalesced,
+            'format': audio_info['format'],
+            'mime_type': audio_info['mime_type'],
+            'sample_rate': audio_info['sample_rate'],
+            'size_bytes': len(audio_data),
             'success': True
         })
             
@@ -372,6 +737,101 @@ def text_to_speech():
     # This is an alias for the voice-clone endpoint for better API naming
     return voice_clone()
 
+@app.route('/api/tts/jobs', methods=['POST'])
+@login_required
+@cross_origin(origins="http://localhost:3000", methods=["POST", "OPTIONS"], supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
+@rate_limited(rate_limiter, 'tts-job', tts_job_request_cost)
+def create_tts_job():
+    """Queue a long text for background synthesis and return the job id."""
+    if not tts_manager.is_available():
+        return jsonify({'error': 'TTS model not available'}), 503
+
+    text_to_speak = request.form.get('text', '').strip()
+    voice_option = request.form.get('voice', 'af_heart')
+
+    if not text_to_speak:
+        return jsonify({'error': 'No text provided'}), 400
+    if len(text_to_speak) > MAX_JOB_TEXT_LENGTH:
+        return jsonify({'error': f'Text is too long (maximum {MAX_JOB_TEXT_LENGTH} characters)'}), 413
+
+    try:
+        # Segments are phonemized by the job workers as they are synthesized, not in this request
+        plan = tts_planner.plan(current_user.id, text_to_speak, max_request_seconds=TTS_JOB_MAX_SECONDS, phonemize=False)
+    except AdmissionError as e:
+        return admission_error_response(e)
+    if not plan.chunks:
+        tts_planner.refund(plan)
+        return jsonify({'error': 'No text provided'}), 400
+
+    try:
+        job = tts_job_queue.submit(current_user.id, plan.text, voice_option, segments=plan.chunks)
+    except Exception as e:
+        print(f"Error creating TTS job: {str(e)}")
+        tts_planner.refund(plan)
+        db.session.rollback()
+        return jsonify({'error': 'Failed to create TTS job', 'details': str(e)}), 500
+
+    try:
+        request_log = ServiceRequest(
+            user_id=current_user.id,
+            service_type='text-to-speech-job',
+            result_data=f'Job: {job.id}, Text: {text_to_speak[:100]}..., Voice: {voice_option}'
+        )
+        db.session.add(request_log)
+        db.session.commit()
+    except Exception as log_error:
+        print(f"Error logging TTS job request: {str(log_error)}")
+        db.session.rollback()
+
+    return jsonify(tts_job_queue.to_dict(job)), 202
+
+def _get_user_job(job_id):
+    job = db.session.get(TTSJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return None
+    return job
+
+@app.route('/api/tts/jobs/<job_id>', methods=['GET', 'DELETE'])
+@login_required
+@cross_origin(origins="http://localhost:3000", methods=["GET", "DELETE", "OPTIONS"], supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
+def tts_job_status(job_id):
+    """Report a job's status and per-segment progress, or delete a job that is not running."""
+    job = _get_user_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if request.method == 'DELETE':
+        if not tts_job_queue.delete(job.id):
+            return jsonify({'error': 'Job is running, try again after the current segment'}), 409
+        return jsonify({'message': 'Job deleted'}), 200
+
+    return jsonify(tts_job_queue.to_dict(job)), 200
+
+@app.route('/api/tts/jobs/<job_id>/audio', methods=['GET'])
+@login_required
+@cross_origin(origins="http://localhost:3000", methods=["GET", "OPTIONS"], supports_credentials=True, allow_headers=["Content-Type", "Authorization", "Range"], expose_headers=["Content-Range", "Accept-Ranges", "Content-Length"])
+def tts_job_audio(job_id):
+    """Download a finished job's audio; supports HTTP Range requests."""
+    job = _get_user_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != 'completed':
+        return jsonify({'error': 'Job is not completed', 'status': tts_job_queue.to_dict(job)['status']}), 409
+
+    result_path = tts_job_queue.result_path(job.id)
+    if not os.path.exists(result_path):
+        return jsonify({'error': 'Job audio is missing'}), 410
+
+    return send_file(result_path, mimetype='audio/wav', as_attachment=True,
+                     download_name=f'tts_{job.id}.wav', conditional=True)
+
+@app.route('/api/rate-limits', methods=['GET'])
+@login_required
+@cross_origin(origins="http://localhost:3000", methods=["GET", "OPTIONS"], supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
+def get_rate_limits():
+    """Rate limiter state: per-endpoint counters and the current user's buckets."""
+    return jsonify(rate_limiter.snapshot(user_id=current_user.id)), 200
+
 # Add a health check endpoint
 @app.route('/api/health', methods=['GET'])
 @cross_origin(origins="*", methods=["GET", "OPTIONS"], supports_credentials=False)
@@ -379,6 +839,9 @@ def health_check():
     return jsonify({
         'status': 'ok',
         'tts_available': tts_manager.is_available(),
+        'model_bundle': model_bundle.version if model_bundle else None,
+        'tts_cost_model': tts_planner.stats(),
+        'tts_coalescing': tts_singleflight.stats(),
         'face_detection_available': face_detector is not None,
         'face_recognition_available': face_recognizer is not None
     })
@@ -491,7 +954,9 @@ def get_request_history():
     """Endpoint to fetch the service request history for the logged-in user."""
     try:
         # Query ServiceRequest entries for the current user, ordered by timestamp
-        requests = ServiceRequest.query.filter_by(user_id=current_user.id).order_by(ServiceRequest.timestamp.desc()).all()
+        requests = read_session().execute(
+            db.select(ServiceRequest).filter_by(user_id=current_user.id).order_by(ServiceRequest.timestamp.desc())
+        ).scalars().all()
 
         # Prepare the data for JSON response
         history_data = []
@@ -0,0 +1,193 @@
+"""ASGI serving mode for the Flask app.
+
+The event loop owns every socket: request bodies are read and responses are
+written asynchronously, so slow uploads, slow base64 downloads and idle
+keep-alive connections cost a coroutine rather than a thread. Only once a
+request body has fully arrived is the (unchanged, synchronous) Flask view
+dispatched to a bounded thread pool, where model inference and database work
+run without blocking the loop.
+
+    python asgi.py --port 5000 --threads 16
+    # or: uvicorn asgi:asgi_app --port 5000
+"""
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+
+# Request bodies larger than this are spooled to disk while they upload
+BODY_SPOOL_SIZE = 1024 * 1024
+
+
+class WSGIExecutorAdapter:
+    """Serve a WSGI application over ASGI, running it in a thread pool."""
+
+    def __init__(self, wsgi_app, max_workers=None):
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+        try:
+            # Read the whole body on the event loop before taking a worker thread
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                more_body = message.get('more_body', False)
+            body_size = body.tell()
+            body.seek(0)
+
+            loop = asyncio.get_running_loop()
+            status, headers, iterator = await loop.run_in_executor(
+                self.executor, self._start_wsgi, self._build_environ(scope, body, body_size)
+            )
+            try:
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                while True:
+                    chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+                    if chunk is None:
+                        break
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            finally:
+                if hasattr(iterator, 'close'):
+                    await loop.run_in_executor(self.executor, iterator.close)
+        finally:
+            body.close()
+
+    def _start_wsgi(self, environ):
+        """Run the WSGI app up to its first body chunk (in a worker thread)."""
+        response = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in response_headers
+            ]
+            return lambda data: None  # legacy write() callable, unused by Flask
+
+        result = self.wsgi_app(environ, start_response)
+        iterator = _ClosingIterator(result)
+        # Flask calls start_response lazily for streamed responses; pull one chunk to trigger it
+        first = next(iterator, None)
+        iterator.push(first)
+        return response['status'], response['headers'], iterator
+
+    def _build_environ(self, scope, body, body_size):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            # The body is fully buffered, so the stream ends where it does (chunked requests have no length)
+            'wsgi.input_terminated': True,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1')
+            value = value.decode('latin-1')
+            if name == 'content-type':
+                key = 'CONTENT_TYPE'
+            elif name == 'content-length':
+                key = 'CONTENT_LENGTH'
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+            if key in environ:
+                environ[key] = f'{environ[key]},{value}'
+            else:
+                environ[key] = value
+        environ.setdefault('CONTENT_LENGTH', str(body_size))
+        return environ
+
+
+class _ClosingIterator:
+    """Iterator over a WSGI result that can un-read one chunk and forwards close()."""
+
+    def __init__(self, result):
+        self._result = result
+        self._iterator = iter(result)
+        self._pushed = []
+        self._lock = threading.Lock()
+
+    def push(self, chunk):
+        if chunk is not None:
+            self._pushed.append(chunk)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            if self._pushed:
+                return self._pushed.pop()
+            return next(self._iterator)
+
+    def close(self):
+        if hasattr(self._result, 'close'):
+            self._result.close()
+
+
+asgi_app = WSGIExecutorAdapter(app.wsgi_app, max_workers=int(os.getenv('ASGI_WORKER_THREADS', '0')) or None)
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Serve the AI Services API in ASGI mode.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=0, help='worker threads for request handling (default: cpu count + 4, max 32)')
+    parser.add_argument('--backlog', type=int, default=2048)
+    args = parser.parse_args(argv)
+
+    served = asgi_app if not args.threads else WSGIExecutorAdapter(app.wsgi_app, max_workers=args.threads)
+    print(f"Serving ASGI on http://{args.host}:{args.port} with {served.max_workers} worker threads")
+    uvicorn.run(served, host=args.host, port=args.port, backlog=args.backlog, lifespan='on', log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import time
+import logging
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+# Output format name -> (soundfile format, subtype, MIME type, file extension)
+AUDIO_FORMATS = {
+    'wav': ('WAV', 'PCM_16', 'audio/wav', '.wav'),
+    'flac': ('FLAC', 'PCM_16', 'audio/flac', '.flac'),
+    'ogg': ('OGG', 'VORBIS', 'audio/ogg', '.ogg'),
+    'opus': ('OGG', 'OPUS', 'audio/ogg; codecs=opus', '.opus'),
+}
+DEFAULT_AUDIO_FORMAT = 'wav'
+
+# libopus only accepts these sample rates
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+BITRATE_MODES = ('CONSTANT', 'AVERAGE', 'VARIABLE')
+
+
+def validate_audio_options(audio_format, sample_rate=None, compression_level=None, bitrate_mode=None):
+    """Raise ValueError if the requested output options cannot be encoded."""
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio format '{audio_format}' (choose from {', '.join(AUDIO_FORMATS)})")
+    if sample_rate is not None:
+        if sample_rate < 8000 or sample_rate > 48000:
+            raise ValueError("Sample rate must be between 8000 and 48000 Hz")
+        if audio_format == 'opus' and sample_rate not in OPUS_SAMPLE_RATES:
+            raise ValueError(f"Opus sample rate must be one of {', '.join(map(str, OPUS_SAMPLE_RATES))}")
+    if compression_level is not None:
+        if audio_format == 'wav':
+            raise ValueError("Compression level is not supported for uncompressed wav")
+        if not 0.0 <= compression_level <= 1.0:
+            raise ValueError("Compression level must be between 0.0 and 1.0")
+    if bitrate_mode is not None:
+        if audio_format != 'opus':
+            raise ValueError("Bitrate mode is only supported for opus")
+        if bitrate_mode not in BITRATE_MODES:
+            raise ValueError(f"Bitrate mode must be one of {', '.join(BITRATE_MODES)}")
+        if compression_level is not None:
+            # libsndfile refuses to change the bitrate mode once a compression level is set
+            raise ValueError("Bitrate mode cannot be combined with a compression level")
+
+
+def resample(audio, input_rate, output_rate):
+    """Resample a mono float32 chunk with torchaudio's windowed-sinc resampler."""
+    if input_rate == output_rate:
+        return audio
+    import torch
+    import torchaudio.functional as F
+    resampled = F.resample(torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32)), input_rate, output_rate)
+    return resampled.numpy()
+
+
+class StreamingEncoder:
+    """Encode audio to a file chunk by chunk as synthesis produces it.
+
+    Chunks are resampled independently. Kokoro yields one chunk per
+    sentence, each starting and ending in near-silence, so there is no
+    audible seam. `compression_level` (0.0-1.0) trades size for quality
+    for FLAC, Vorbis and Opus; for the lossy codecs it sets the target
+    bitrate. `bitrate_mode` selects constant/average/variable bitrate for
+    Opus, and cannot be combined with `compression_level`.
+    """
+
+    def __init__(self, output_path, audio_format=DEFAULT_AUDIO_FORMAT, input_rate=24000,
+                 sample_rate=None, compression_level=None, bitrate_mode=None):
+        validate_audio_options(audio_format, sample_rate, compression_level, bitrate_mode)
+        sf_format, subtype, self.mime_type, _ = AUDIO_FORMATS[audio_format]
+        self.audio_format = audio_format
+        self.output_path = output_path
+        self.input_rate = input_rate
+        self.sample_rate = sample_rate or input_rate
+
+        options = {}
+        if compression_level is not None:
+            options['compression_level'] = compression_level
+        if bitrate_mode is not None:
+            options['bitrate_mode'] = bitrate_mode
+        self._file = sf.SoundFile(output_path, 'w', samplerate=self.sample_rate, channels=1,
+                                  format=sf_format, subtype=subtype, **options)
+        self.samples_written = 0
+        self.encode_seconds = 0.0
+
+    def write(self, chunk):
+        started = time.perf_counter()
+        chunk = resample(np.asarray(chunk, dtype=np.float32), self.input_rate, self.sample_rate)
+        self._file.write(chunk)
+        self.samples_written += len(chunk)
+        self.encode_seconds += time.perf_counter() - started
+
+    def close(self):
+        """Finish the file and return size/timing stats for it."""
+        started = time.perf_counter()
+        self._file.close()
+        self.encode_seconds += time.perf_counter() - started
+        return {
+            'format': self.audio_format,
+            'mime_type': self.mime_type,
+            'sample_rate': self.sample_rate,
+            'audio_seconds': self.samples_written / self.sample_rate,
+            'encode_seconds': self.encode_seconds,
+        }
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.stats = self.close()
+        else:
+            self.abort()
+        return False
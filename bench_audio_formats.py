@@ -0,0 +1,80 @@
+"""Report payload size and encode time for each TTS output format.
+
+    python bench_audio_formats.py
+    python bench_audio_formats.py --stub --text-file article.txt
+"""
+import os
+import argparse
+import tempfile
+
+from audio_encoding import AUDIO_FORMATS
+
+DEFAULT_TEXT = (
+    "The quick brown fox jumps over the lazy dog. "
+    "Text to speech responses are base64 encoded into JSON, so every byte of audio costs four thirds of a byte "
+    "on the wire. Compressed formats make a large difference on slow mobile connections."
+)
+
+# (format, sample rate, compression level) combinations to compare
+DEFAULT_CASES = [
+    ('wav', None, None),
+    ('flac', None, 0.5),
+    ('ogg', None, 0.5),
+    ('opus', None, 0.5),
+    ('opus', None, 0.8),
+    ('opus', 16000, 0.8),
+]
+
+
+def parse_case(value):
+    audio_format, _, rest = value.partition(':')
+    rate, _, level = rest.partition(':')
+    return audio_format, int(rate) if rate else None, float(level) if level else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare TTS output formats.')
+    parser.add_argument('--stub', action='store_true', help='use the stub TTS backend instead of Kokoro')
+    parser.add_argument('--text-file', help='read the text to synthesize from a file')
+    parser.add_argument('--voice', default='af_heart')
+    parser.add_argument('--case', action='append', dest='cases', type=parse_case,
+                        help='format[:sample_rate[:compression_level]], repeatable (default: a standard set)')
+    args = parser.parse_args(argv)
+
+    text = DEFAULT_TEXT
+    if args.text_file:
+        with open(args.text_file) as f:
+            text = f.read()
+
+    if args.stub:
+        from stub_backends import StubTTSManager
+        manager = StubTTSManager(latency=0, jitter=0, per_char=0)
+    else:
+        from tts_manager import TTSManager
+        manager = TTSManager()
+        if not manager.is_available():
+            raise SystemExit("TTS model is not available")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for audio_format, sample_rate, compression_level in args.cases or DEFAULT_CASES:
+            path = os.path.join(tmp, f'bench{AUDIO_FORMATS[audio_format][3]}')
+            stats = manager.generate_speech(text, path, voice=args.voice, audio_format=audio_format,
+                                            sample_rate=sample_rate, compression_level=compression_level)
+            stats['compression_level'] = compression_level
+            results.append(stats)
+
+    wav_bytes = next((r['bytes'] for r in results if r['format'] == 'wav'), results[0]['bytes'])
+    print(f"{len(text)} characters, {results[0]['audio_seconds']:.1f}s of audio\n")
+    print(f"{'format':<6} {'rate':>6} {'level':>6} {'bytes':>10} {'base64':>10} {'kbps':>7} {'vs wav':>7} {'encode ms':>10}")
+    for r in results:
+        base64_bytes = 4 * ((r['bytes'] + 2) // 3)
+        kbps = r['bytes'] * 8 / 1000 / r['audio_seconds'] if r['audio_seconds'] else 0
+        level = f"{r['compression_level']:.2f}" if r['compression_level'] is not None else '-'
+        print(f"{r['format']:<6} {r['sample_rate']:>6} {level:>6} {r['bytes']:>10} {base64_bytes:>10} "
+              f"{kbps:>7.1f} {r['bytes'] / wav_bytes:>6.1%} {r['encode_seconds'] * 1000:>10.1f}")
+    return results
+
+
+if __name__ == '__main__':
+    main()
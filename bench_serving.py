@@ -0,0 +1,159 @@
+"""Compare the threaded development server with the ASGI serving mode.
+
+Each mode is started in a subprocess with stub models and a scratch database.
+While a number of slow clients hold connections open (trickling their request
+headers a byte at a time), load_test.py drives the normal endpoint mix. The
+report shows latency/error rates together with the server's thread count and
+resident memory, which is where thread-per-connection serving falls over.
+
+    python bench_serving.py --slow-clients 500 --rate 20 --duration 20
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import requests
+
+from load_test import LoadTest, DEFAULT_MIX, print_report
+
+MODES = {
+    'threaded': [sys.executable, '-c', 'import sys; from app import app; app.run(port=int(sys.argv[1]), threaded=True)'],
+    'asgi': [sys.executable, 'asgi.py', '--port'],
+}
+
+
+def wait_until_ready(base_url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if requests.get(f'{base_url}/api/health', timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("Server did not become ready in time")
+
+
+def process_stats(pid):
+    """Thread count and RSS (MB) of a process, read from /proc (Linux only)."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return {
+            'threads': int(fields['Threads'].strip()),
+            'rss_mb': int(fields['VmRSS'].strip().split()[0]) / 1024,
+        }
+    except (OSError, KeyError):
+        return {'threads': None, 'rss_mb': None}
+
+
+class SlowClients:
+    """Hold connections open by sending a request's headers one byte at a time."""
+
+    def __init__(self, host, port, count, byte_interval=1.0):
+        self.host = host
+        self.port = port
+        self.count = count
+        self.byte_interval = byte_interval
+        self.sockets = []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._trickle, daemon=True)
+
+    def start(self):
+        for _ in range(self.count):
+            try:
+                self.sockets.append(socket.create_connection((self.host, self.port), timeout=5))
+            except OSError:
+                break
+        self.thread.start()
+        return len(self.sockets)
+
+    def _trickle(self):
+        request = b'GET /api/health HTTP/1.1\r\nHost: localhost\r\nX-Slow-Client: ' + b'x' * 4096
+        position = 0
+        while not self.stop_event.wait(self.byte_interval) and position < len(request):
+            for sock in list(self.sockets):
+                try:
+                    sock.send(request[position:position + 1])
+                except OSError:
+                    self.sockets.remove(sock)
+            position += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        for sock in self.sockets:
+            sock.close()
+
+
+def run_mode(mode, args):
+    port = args.port
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, AI_SERVICES_STUB_MODELS='1')
+    with tempfile.TemporaryDirectory() as tmp:
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        process = subprocess.Popen(MODES[mode] + [str(port)], env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_ready(base_url, process)
+            idle_stats = process_stats(process.pid)
+
+            slow = SlowClients('127.0.0.1', port, args.slow_clients)
+            opened = slow.start()
+            time.sleep(1)
+            loaded_stats = process_stats(process.pid)
+
+            test = LoadTest(base_url, users=args.users)
+            test.setup_users()
+            report = test.run(args.rate, args.duration, mix=args.mix)
+            peak_stats = process_stats(process.pid)
+            slow.stop()
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report['server'] = {
+        'slow_clients_opened': opened,
+        'idle': idle_stats,
+        'with_slow_clients': loaded_stats,
+        'after_load': peak_stats,
+    }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark threaded vs ASGI serving.')
+    parser.add_argument('--modes', default='threaded,asgi')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--slow-clients', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=20.0)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for mode in args.modes.split(','):
+        print(f"\n=== {mode} ===")
+        results[mode] = run_mode(mode, args)
+        print_report(results[mode])
+
+    print(f"\n{'mode':<10} {'slow conns':>10} {'threads':>8} {'rss MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, report in results.items():
+        server, overall = report['server'], report['overall']
+        threads = server['with_slow_clients']['threads']
+        rss = server['with_slow_clients']['rss_mb']
+        print(f"{mode:<10} {server['slow_clients_opened']:>10} {threads if threads is not None else '-':>8} "
+              f"{rss if rss is not None else 0:>8.1f} {(overall['p50'] or 0) * 1000:>8.1f} "
+              f"{(overall['p99'] or 0) * 1000:>8.1f} {overall['error_rate'] * 100:>6.1f}%")
+    return results
+
+
+if __name__ == '__main__':
+    main()
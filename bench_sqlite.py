@@ -0,0 +1,132 @@
+"""Mixed read/write SQLite benchmark: default engine vs. the SQLiteTuning layer.
+
+Writer threads insert ServiceRequest-like rows and commit one at a time, the
+way every API call logs itself. Reader threads list a user's history, like
+/api/history. Each configuration gets a fresh database file.
+
+    python bench_sqlite.py --writers 8 --readers 8 --duration 10
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import threading
+from sqlalchemy import create_engine, text
+
+from db_config import SQLiteTuning
+from load_test import percentile
+
+SCHEMA = """
+CREATE TABLE service_request (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    service_type VARCHAR(50) NOT NULL,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+    result_data TEXT
+)
+"""
+INSERT = text("INSERT INTO service_request (user_id, service_type, result_data) VALUES (:user_id, :service_type, :result_data)")
+SELECT = text("SELECT id, service_type, timestamp, result_data FROM service_request "
+              "WHERE user_id = :user_id ORDER BY timestamp DESC")
+
+
+def build_engines(mode, path, args):
+    """Return (write engine, read engine) for a configuration."""
+    url = f'sqlite:///{path}'
+    if mode == 'default':
+        # What Flask-SQLAlchemy creates for 'sqlite:///site.db' with no options
+        engine = create_engine(url)
+        return engine, engine
+
+    tuning = SQLiteTuning(busy_timeout_ms=args.busy_timeout, pool_size=args.writers + args.readers,
+                          synchronous=args.synchronous, read_connections=(mode == 'tuned+read'))
+    engine = tuning.install(create_engine(url, **tuning.engine_options()))
+    with engine.connect():
+        pass  # first connection switches the file to WAL before the read pool opens it
+    read_engine = tuning.create_read_engine(url) if tuning.read_connections else engine
+    return engine, read_engine
+
+
+def run(mode, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        engine, read_engine = build_engines(mode, path, args)
+        with engine.begin() as conn:
+            conn.execute(text(SCHEMA))
+            conn.execute(text("CREATE INDEX ix_service_request_user ON service_request (user_id)"))
+            for i in range(args.seed_rows):
+                conn.execute(INSERT, {'user_id': i % args.users, 'service_type': 'text-to-speech', 'result_data': 'x' * 200})
+
+        stop = threading.Event()
+        results = {'write': [], 'read': [], 'write_errors': 0, 'read_errors': 0}
+        lock = threading.Lock()
+
+        def worker(kind):
+            local, errors = [], 0
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    if kind == 'write':
+                        with engine.begin() as conn:
+                            conn.execute(INSERT, {'user_id': random.randrange(args.users),
+                                                  'service_type': 'face-detection', 'result_data': 'y' * 200})
+                    else:
+                        with read_engine.connect() as conn:
+                            conn.execute(SELECT, {'user_id': random.randrange(args.users)}).fetchall()
+                    local.append(time.perf_counter() - started)
+                except Exception:
+                    errors += 1
+            with lock:
+                results[kind].extend(local)
+                results[f'{kind}_errors'] += errors
+
+        threads = [threading.Thread(target=worker, args=('write',)) for _ in range(args.writers)]
+        threads += [threading.Thread(target=worker, args=('read',)) for _ in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+        if read_engine is not engine:
+            read_engine.dispose()
+
+    report = {}
+    for kind in ('write', 'read'):
+        latencies = sorted(results[kind])
+        report[kind] = {
+            'ops_per_second': len(latencies) / args.duration,
+            'errors': results[f'{kind}_errors'],
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark SQLite mixed read/write throughput.')
+    parser.add_argument('--modes', default='default,tuned,tuned+read')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--seed-rows', type=int, default=5000)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--busy-timeout', type=int, default=5000, help='busy timeout (ms) for tuned modes')
+    parser.add_argument('--synchronous', default='NORMAL')
+    args = parser.parse_args(argv)
+
+    reports = {}
+    print(f"{'mode':<11} {'kind':<6} {'ops/s':>9} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in args.modes.split(','):
+        reports[mode] = run(mode, args)
+        for kind, stats in reports[mode].items():
+            p50 = stats['p50'] * 1000 if stats['p50'] is not None else 0
+            p99 = stats['p99'] * 1000 if stats['p99'] is not None else 0
+            print(f"{mode:<11} {kind:<6} {stats['ops_per_second']:>9.1f} {stats['errors']:>7} {p50:>8.2f} {p99:>8.2f}")
+    return reports
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import os
+import logging
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def is_memory_database(url):
+    """True for in-memory SQLite URLs, which get a single shared connection (StaticPool)."""
+    url = make_url(url)
+    database = url.database or ''
+    return database in ('', ':memory:') or database.startswith('file::memory:') or url.query.get('mode') == 'memory'
+
+
+class SQLiteTuning:
+    """Connection-level settings for SQLite databases.
+
+    * journal_mode=WAL lets readers and the single writer proceed concurrently
+      instead of blocking each other; synchronous=NORMAL is durable for WAL
+      except for the last transactions before a power loss.
+    * busy_timeout makes a connection wait for the write lock instead of
+      failing immediately with "database is locked".
+    * The pool keeps pool_size connections open (plus max_overflow more
+      under load) so requests do not reconnect and re-run PRAGMAs.
+    * With read_connections enabled, read-only queries such as the history
+      listing can use a separate pool of read-only connections, so they never
+      queue behind writers for a pooled connection.
+    """
+
+    def __init__(self, journal_mode='WAL', synchronous='NORMAL', busy_timeout_ms=5000, pool_size=10,
+                 max_overflow=20, pool_timeout=30, read_connections=True, read_pool_size=10):
+        if journal_mode.upper() not in JOURNAL_MODES:
+            raise ValueError(f"Unsupported SQLite journal mode '{journal_mode}'")
+        if synchronous.upper() not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Unsupported SQLite synchronous mode '{synchronous}'")
+        self.journal_mode = journal_mode.upper()
+        self.synchronous = synchronous.upper()
+        self.busy_timeout_ms = busy_timeout_ms
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.read_connections = read_connections
+        self.read_pool_size = read_pool_size
+        self.read_engine = None
+        self.read_session = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            journal_mode=os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+            synchronous=os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+            busy_timeout_ms=int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+            pool_size=int(os.getenv('DB_POOL_SIZE', '10')),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '20')),
+            pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+            read_connections=os.getenv('SQLITE_READ_CONNECTIONS', '1') == '1',
+            read_pool_size=int(os.getenv('SQLITE_READ_POOL_SIZE', '10')),
+        )
+
+    def engine_options(self, url=None):
+        """Keyword arguments for create_engine (or SQLALCHEMY_ENGINE_OPTIONS).
+
+        In-memory databases use a StaticPool, which takes no pool options.
+        """
+        options = {
+            'connect_args': {
+                # Python's sqlite3 timeout is the busy timeout, in seconds
+                'timeout': self.busy_timeout_ms / 1000.0,
+                # Pooled connections move between request threads
+                'check_same_thread': False,
+            },
+        }
+        if url is None or not is_memory_database(url):
+            options.update({
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'pool_timeout': self.pool_timeout,
+                'pool_pre_ping': False,
+            })
+        return options
+
+    def install(self, engine, read_only=False):
+        """Apply the PRAGMAs to every new connection the engine opens."""
+        pragmas = [f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}']
+        if read_only:
+            pragmas.append('PRAGMA query_only = 1')
+        else:
+            # journal_mode is persistent in the database file, so the writer pool sets it
+            pragmas.append(f'PRAGMA journal_mode = {self.journal_mode}')
+        pragmas.append(f'PRAGMA synchronous = {self.synchronous}')
+
+        @event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+        return engine
+
+    @staticmethod
+    def read_only_url(url):
+        """The same database file as a read-only SQLite URI (mode=ro)."""
+        url = make_url(url)
+        database = url.database
+        if not database.startswith('file:'):
+            database = f'file:{database}'
+        return url.set(database=database, query={**url.query, 'mode': 'ro', 'uri': 'true'})
+
+    def create_read_engine(self, url):
+        """A pool of read-only connections to the database file of an SQLite URL."""
+        engine = create_engine(
+            self.read_only_url(url),
+            pool_size=self.read_pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            connect_args={'timeout': self.busy_timeout_ms / 1000.0, 'check_same_thread': False},
+        )
+        return self.install(engine, read_only=True)
+
+    def attach(self, app, db):
+        """Install the PRAGMAs on the Flask-SQLAlchemy engine and set up read connections.
+
+        Call after SQLAlchemy(app) (configured with engine_options()) and before
+        the first query.
+        """
+        with app.app_context():
+            self.install(db.engine)
+            url = db.engine.url
+        # Read-only connections need the file to exist, and only WAL lets them read during writes
+        if self.read_connections and self.journal_mode == 'WAL' and not is_memory_database(url):
+            self.read_engine = self.create_read_engine(url)
+            self.read_session = scoped_session(sessionmaker(bind=self.read_engine))
+
+            @app.teardown_appcontext
+            def remove_read_session(exception=None):
+                self.read_session.remove()
+
+        logger.info(f"SQLite tuning: journal_mode={self.journal_mode}, synchronous={self.synchronous}, "
+                    f"busy_timeout={self.busy_timeout_ms}ms, pool={self.pool_size}+{self.max_overflow}, "
+                    f"read connections={'on' if self.read_engine is not None else 'off'}")
+
+    def dispose(self):
+        """Drop pooled read connections, e.g. in a freshly forked worker."""
+        if self.read_engine is not None:
+            self.read_engine.dispose(close=False)
@@ -0,0 +1,29 @@
+# Pre-fork serving: models are loaded once in the parent and shared with the workers.
+#
+#     gunicorn app:app
+#
+# WEB_CONCURRENCY sets the number of worker processes, WORKER_THREADS the request
+# threads in each, BIND the listen address.
+import os
+import prefork
+
+bind = os.getenv('BIND', '127.0.0.1:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'gthread'
+threads = int(os.getenv('WORKER_THREADS', '4'))
+# Synchronous TTS requests can legitimately take a while
+timeout = int(os.getenv('WORKER_TIMEOUT', '300'))
+preload_app = True
+
+prefork.prepare_parent()
+
+
+def when_ready(server):
+    prefork.freeze_parent()
+
+
+def post_fork(server, worker):
+    # Use the effective settings, which command-line options such as -w may override.
+    # Request threads and TTS job threads can all be running inference at once.
+    inference_threads = server.cfg.threads + int(os.getenv('TTS_JOB_WORKERS', '1'))
+    prefork.init_worker(server.cfg.workers, inference_threads)
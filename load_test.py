@@ -0,0 +1,230 @@
+"""HTTP load generator for the AI Services API.
+
+Drives /api/login, /api/tts, /api/face-detection and /api/history at a fixed
+target request rate (open loop) and reports latency percentiles and error
+rates per endpoint. Start the server with stub models to measure the server
+itself rather than the models:
+
+    AI_SERVICES_STUB_MODELS=1 DATABASE_URL=sqlite:///loadtest.db python app.py
+    python load_test.py --rate 20 --duration 30
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+DEFAULT_IMAGES = [
+    os.path.join('Samples', 'Sample Pictures', 'picture1.jpg'),
+    os.path.join('Samples', 'Sample Pictures', 'picture2.jpg'),
+]
+DEFAULT_TEXT = "Hello, this is a load test of the text to speech service."
+DEFAULT_MIX = 'login=1,tts=2,face=2,history=3'
+PASSWORD = 'load-test-password'
+
+_thread_state = threading.local()
+
+
+def _http():
+    """One requests.Session per worker thread so connections are reused safely."""
+    if not hasattr(_thread_state, 'session'):
+        _thread_state.session = requests.Session()
+    return _thread_state.session
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(ENDPOINTS)
+    if unknown:
+        raise ValueError(f"Unknown endpoints in mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+class LoadTest:
+    def __init__(self, base_url, users=5, images=None, text=DEFAULT_TEXT, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.text = text
+        self.usernames = [f'loadtest_user_{i}' for i in range(users)]
+        self.cookies = {}
+        self.images = []
+        for path in images or DEFAULT_IMAGES:
+            with open(path, 'rb') as f:
+                self.images.append((os.path.basename(path), f.read()))
+
+    def setup_users(self):
+        """Create the load test accounts (if needed) and log each one in once."""
+        for username in self.usernames:
+            session = requests.Session()
+            session.post(f'{self.base_url}/api/signup', json={
+                'username': username,
+                'email': f'{username}@example.com',
+                'password': PASSWORD,
+            }, timeout=self.timeout)
+            response = session.post(f'{self.base_url}/api/login', json={
+                'username': username, 'password': PASSWORD,
+            }, timeout=self.timeout)
+            if response.status_code != 200:
+                raise RuntimeError(f"Could not log in {username}: {response.status_code} {response.text}")
+            self.cookies[username] = session.cookies.get_dict()
+
+    def _random_cookies(self):
+        return self.cookies[random.choice(self.usernames)]
+
+    def login(self):
+        return _http().post(f'{self.base_url}/api/login', json={
+            'username': random.choice(self.usernames), 'password': PASSWORD,
+        }, timeout=self.timeout)
+
+    def tts(self):
+        return _http().post(f'{self.base_url}/api/tts', data={
+            'text': self.text, 'voice': 'af_heart',
+        }, cookies=self._random_cookies(), timeout=self.timeout)
+
+    def face(self):
+        (name1, data1), (name2, data2) = random.sample(self.images, 2) if len(self.images) > 1 else self.images * 2
+        return _http().post(f'{self.base_url}/api/face-detection', files={
+            'image1': (name1, data1), 'image2': (name2, data2),
+        }, cookies=self._random_cookies(), timeout=self.timeout)
+
+    def history(self):
+        return _http().get(f'{self.base_url}/api/history', cookies=self._random_cookies(), timeout=self.timeout)
+
+    def run(self, rate, duration, mix=DEFAULT_MIX, max_workers=256):
+        """Issue requests at `rate` per second for `duration` seconds and return a report dict.
+
+        Latency is measured from each request's scheduled start time, so time
+        spent queued behind a saturated client pool is counted too.
+        """
+        weights = parse_mix(mix) if isinstance(mix, str) else mix
+        names = list(weights)
+        samples = {name: [] for name in names}
+        lock = threading.Lock()
+
+        def fire(name, scheduled):
+            status, error = None, None
+            try:
+                status = getattr(self, name)().status_code
+            except Exception as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - scheduled
+            with lock:
+                samples[name].append((elapsed, status, error))
+
+        interval = 1.0 / rate
+        total = int(rate * duration)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for i in range(total):
+                scheduled = started + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                name = random.choices(names, weights=[weights[n] for n in names])[0]
+                pool.submit(fire, name, scheduled)
+        wall_time = time.perf_counter() - started
+
+        return build_report(samples, wall_time, rate)
+
+
+ENDPOINTS = {
+    'login': LoadTest.login,
+    'tts': LoadTest.tts,
+    'face': LoadTest.face,
+    'history': LoadTest.history,
+}
+
+
+def build_report(samples, wall_time, target_rate):
+    report = {'target_rate': target_rate, 'wall_time': wall_time, 'endpoints': {}}
+    all_latencies, all_errors, all_count = [], 0, 0
+    for name, entries in samples.items():
+        latencies = sorted(elapsed for elapsed, _, _ in entries)
+        errors = sum(1 for _, status, error in entries if error or status is None or status >= 400)
+        statuses = {}
+        for _, status, error in entries:
+            key = str(status) if status is not None else error
+            statuses[key] = statuses.get(key, 0) + 1
+        report['endpoints'][name] = {
+            'count': len(entries),
+            'error_rate': errors / len(entries) if entries else 0.0,
+            'statuses': statuses,
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+        }
+        all_latencies.extend(latencies)
+        all_errors += errors
+        all_count += len(entries)
+    all_latencies.sort()
+    report['overall'] = {
+        'count': all_count,
+        'achieved_rate': all_count / wall_time if wall_time else 0.0,
+        'error_rate': all_errors / all_count if all_count else 0.0,
+        'p50': percentile(all_latencies, 50),
+        'p90': percentile(all_latencies, 90),
+        'p99': percentile(all_latencies, 99),
+        'max': all_latencies[-1] if all_latencies else None,
+    }
+    return report
+
+
+def print_report(report):
+    def ms(value):
+        return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+
+    print(f"Target rate {report['target_rate']:.1f} req/s, "
+          f"achieved {report['overall']['achieved_rate']:.1f} req/s over {report['wall_time']:.1f}s")
+    print(f"{'endpoint':<10} {'count':>7} {'errors':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses")
+    rows = list(report['endpoints'].items()) + [('overall', report['overall'])]
+    for name, stats in rows:
+        print(f"{name:<10} {stats['count']:>7} {stats['error_rate'] * 100:>7.1f}% "
+              f"{ms(stats['p50'])} {ms(stats['p90'])} {ms(stats['p99'])} {ms(stats['max'])}  "
+              f"{json.dumps(stats.get('statuses', ''))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the AI Services HTTP API.')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--rate', type=float, default=10.0, help='target requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to generate load')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='endpoint weights, e.g. "login=1,tts=2,face=2,history=3"')
+    parser.add_argument('--users', type=int, default=5, help='number of test accounts to spread requests over')
+    parser.add_argument('--image', action='append', dest='images', help='image for face requests (repeatable)')
+    parser.add_argument('--text', default=DEFAULT_TEXT, help='text sent to /api/tts')
+    parser.add_argument('--max-workers', type=int, default=256, help='client threads available for in-flight requests')
+    parser.add_argument('--json', help='also write the report to this file as JSON')
+    args = parser.parse_args(argv)
+
+    test = LoadTest(args.base_url, users=args.users, images=args.images, text=args.text)
+    test.setup_users()
+    report = test.run(args.rate, args.duration, mix=args.mix, max_workers=args.max_workers)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(1)
@@ -0,0 +1,247 @@
+"""Versioned, checksummed offline bundle of every model the server needs.
+
+Build once (needs network access for the Kokoro files):
+
+    python model_bundle.py build --version 2024.1 --out bundles
+
+That produces bundles/ai-services-models-2024.1/ containing the Kokoro
+config, weights and voice packs, the YuNet and SFace ONNX files and a
+manifest.json with the size and SHA-256 of every file. Point the server at it
+with MODEL_BUNDLE=bundles/ai-services-models-2024.1 and startup loads
+everything from local disk without touching the HuggingFace hub.
+
+    python model_bundle.py verify bundles/ai-services-models-2024.1
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import inspect
+import logging
+import argparse
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+BUNDLE_FORMAT = 1
+BUNDLE_NAME = 'ai-services-models'
+
+KOKORO_REPO_ID = 'hexgrad/Kokoro-82M'
+KOKORO_CONFIG = 'config.json'
+KOKORO_WEIGHTS = 'kokoro-v1_0.pth'
+DEFAULT_VOICES = ['af_heart', 'af_bella', 'am_michael', 'bf_emma', 'bm_george']
+
+FACE_MODELS = {
+    'detection': 'face_detection_yunet_2023mar.onnx',
+    'recognition': 'face_recognition_sface_2021dec.onnx',
+}
+
+
+class BundleError(Exception):
+    """The model bundle is missing, incomplete or does not match its manifest."""
+
+
+def sha256_file(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _mmap_torch_load():
+    """Make torch.load memory-map checkpoints while KModel reads its weights.
+
+    KModel calls torch.load itself, so mmap cannot be passed through. With
+    mmap the checkpoint tensors are paged in from the (page-cached) file
+    instead of being read into a temporary private copy. KModel then copies
+    them into its own parameters with load_state_dict, so the weights that
+    stay in memory are ordinary allocations; this only avoids holding a
+    second copy while loading.
+    """
+    import torch
+    if 'mmap' not in inspect.signature(torch.load).parameters:
+        # torch < 2.1 cannot memory-map checkpoints; load them normally
+        logger.info("torch.load does not support mmap, loading the Kokoro checkpoint without it")
+        yield
+        return
+    original = torch.load
+
+    def load(f, *args, **kwargs):
+        kwargs.setdefault('mmap', True)
+        return original(f, *args, **kwargs)
+
+    torch.load = load
+    try:
+        yield
+    finally:
+        torch.load = original
+
+
+class ModelBundle:
+    """A loaded bundle directory and its manifest."""
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.repo_id = manifest['kokoro']['repo_id']
+
+    @classmethod
+    def load(cls, path, verify='size'):
+        """Open a bundle, checking its files against the manifest.
+
+        verify='size' checks that every file exists with the recorded size
+        (instant). verify='full' also re-hashes every file. verify='none'
+        only reads the manifest.
+        """
+        manifest_path = os.path.join(path, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise BundleError(f"No {MANIFEST_NAME} in model bundle {path}")
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != BUNDLE_FORMAT:
+            raise BundleError(f"Unsupported model bundle format {manifest.get('format')}")
+
+        bundle = cls(path, manifest)
+        if verify != 'none':
+            bundle.verify(full=verify == 'full')
+        logger.info(f"Loaded model bundle {manifest['name']} version {bundle.version} from {path}")
+        return bundle
+
+    def file_path(self, relative_path):
+        return os.path.join(self.path, *relative_path.split('/'))
+
+    def verify(self, full=False):
+        problems = []
+        for relative_path, info in self.manifest['files'].items():
+            path = self.file_path(relative_path)
+            if not os.path.exists(path):
+                problems.append(f"{relative_path}: missing")
+            elif os.path.getsize(path) != info['size']:
+                problems.append(f"{relative_path}: size {os.path.getsize(path)} != {info['size']}")
+            elif full and sha256_file(path) != info['sha256']:
+                problems.append(f"{relative_path}: checksum mismatch")
+        if problems:
+            raise BundleError("Model bundle verification failed: " + '; '.join(problems))
+
+    @property
+    def voices(self):
+        return sorted(self.manifest['kokoro']['voices'])
+
+    def voice_path(self, voice):
+        """Local .pt file for a voice name, or None if the bundle does not include it."""
+        relative_path = self.manifest['kokoro']['voices'].get(voice)
+        return self.file_path(relative_path) if relative_path else None
+
+    def face_model_path(self, kind):
+        return self.file_path(self.manifest['face'][kind])
+
+    def load_kokoro_model(self):
+        """Build a KModel from the bundled config and weights, without a second copy while loading."""
+        from kokoro import KModel
+        kokoro = self.manifest['kokoro']
+        with _mmap_torch_load():
+            model = KModel(
+                repo_id=self.repo_id,
+                config=self.file_path(kokoro['config']),
+                model=self.file_path(kokoro['model']),
+            )
+        return model.eval()
+
+
+def build_bundle(out_dir, version, voices=DEFAULT_VOICES, face_models_dir='models', kokoro_dir=None,
+                 repo_id=KOKORO_REPO_ID):
+    """Copy all model files into a new versioned bundle directory and write its manifest."""
+    bundle_dir = os.path.join(out_dir, f'{BUNDLE_NAME}-{version}')
+    if os.path.exists(bundle_dir):
+        raise BundleError(f"{bundle_dir} already exists; bundles are immutable, pick a new version")
+
+    if kokoro_dir is None:
+        from huggingface_hub import snapshot_download
+        patterns = [KOKORO_CONFIG, KOKORO_WEIGHTS] + [f'voices/{voice}.pt' for voice in voices]
+        print(f"Downloading {repo_id} ({len(voices)} voices)...")
+        kokoro_dir = snapshot_download(repo_id, allow_patterns=patterns)
+
+    sources = {
+        f'kokoro/{KOKORO_CONFIG}': os.path.join(kokoro_dir, KOKORO_CONFIG),
+        f'kokoro/{KOKORO_WEIGHTS}': os.path.join(kokoro_dir, KOKORO_WEIGHTS),
+    }
+    for voice in voices:
+        sources[f'kokoro/voices/{voice}.pt'] = os.path.join(kokoro_dir, 'voices', f'{voice}.pt')
+    for filename in FACE_MODELS.values():
+        sources[f'face/{filename}'] = os.path.join(face_models_dir, filename)
+
+    missing = [source for source in sources.values() if not os.path.exists(source)]
+    if missing:
+        raise BundleError("Missing model files: " + ', '.join(missing))
+
+    staging_dir = bundle_dir + '.partial'
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    files = {}
+    for relative_path, source in sources.items():
+        target = os.path.join(staging_dir, *relative_path.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(source, target)
+        files[relative_path] = {'size': os.path.getsize(target), 'sha256': sha256_file(target)}
+        print(f"  {relative_path} ({files[relative_path]['size']} bytes)")
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'name': BUNDLE_NAME,
+        'version': version,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'kokoro': {
+            'repo_id': repo_id,
+            'config': f'kokoro/{KOKORO_CONFIG}',
+            'model': f'kokoro/{KOKORO_WEIGHTS}',
+            'voices': {voice: f'kokoro/voices/{voice}.pt' for voice in voices},
+        },
+        'face': {kind: f'face/{filename}' for kind, filename in FACE_MODELS.items()},
+        'files': files,
+    }
+    with open(os.path.join(staging_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    # Only a complete bundle ever appears under the final name
+    os.replace(staging_dir, bundle_dir)
+    return bundle_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or verify an offline model bundle.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='create a new bundle')
+    build.add_argument('--version', required=True)
+    build.add_argument('--out', default='bundles')
+    build.add_argument('--voices', default=','.join(DEFAULT_VOICES), help='comma-separated Kokoro voice names')
+    build.add_argument('--face-models-dir', default='models', help='directory containing the YuNet and SFace ONNX files')
+    build.add_argument('--kokoro-dir', help='use an existing local copy of the Kokoro repo instead of downloading')
+
+    verify = subparsers.add_parser('verify', help='check a bundle against its manifest')
+    verify.add_argument('path')
+    verify.add_argument('--quick', action='store_true', help='check sizes only, skip SHA-256')
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'build':
+            voices = [voice.strip() for voice in args.voices.split(',') if voice.strip()]
+            bundle_dir = build_bundle(args.out, args.version, voices=voices,
+                                      face_models_dir=args.face_models_dir, kokoro_dir=args.kokoro_dir)
+            print(f"Model bundle written to {bundle_dir}")
+        else:
+            bundle = ModelBundle.load(args.path, verify='size' if args.quick else 'full')
+            print(f"Model bundle {bundle.version} OK ({len(bundle.manifest['files'])} files)")
+    except BundleError as e:
+        print(f"Error: {str(e)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
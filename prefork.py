@@ -0,0 +1,83 @@
+"""Helpers for pre-fork serving (see gunicorn.conf.py).
+
+The parent process imports app.py once, loading Kokoro and the ONNX models,
+and then forks the workers. Model weights live in memory that the workers
+only read, so they stay shared copy-on-write instead of being loaded once per
+worker. Two things keep them shared and the workers healthy:
+
+* The parent runs with one math thread. GNU OpenMP (used by torch) and
+  OpenCV's thread pool do not survive fork() if they already started
+  threads in the parent.
+* gc.freeze() moves everything loaded so far out of the garbage
+  collector's reach, so collections in the workers do not write to (and
+  thereby copy) the parent's pages.
+
+Each worker then gets its share of the CPU cores for torch and OpenCV,
+split again between the threads in it that can run inference at the same
+time (request threads plus TTS job threads), so that even with every one
+of them busy there is about one math thread per core.
+"""
+import os
+import gc
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def threads_per_worker(workers, inference_threads=1, cpus=None):
+    """Math threads for each worker's torch/OpenCV thread pools."""
+    cpus = cpus or available_cpus()
+    return max(1, cpus // (max(1, workers) * max(1, inference_threads)))
+
+
+def prepare_parent():
+    """Call before the app (and its models) are loaded in the parent process."""
+    os.environ['AI_SERVICES_PREFORK'] = '1'
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[name] = '1'
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def freeze_parent():
+    """Call after the app is loaded, right before the first fork."""
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Froze {gc.get_freeze_count()} objects before forking workers")
+
+
+def init_worker(workers, inference_threads=1):
+    """Call in each worker right after fork.
+
+    `workers` is the number of worker processes and `inference_threads` the
+    number of threads in each that may run models concurrently.
+    """
+    threads = threads_per_worker(workers, inference_threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    import cv2
+    cv2.setNumThreads(threads)
+
+    from app import app, db, sqlite_tuning, tts_job_queue
+    # Never share the parent's pooled database connections across processes
+    with app.app_context():
+        db.engine.dispose(close=False)
+    if sqlite_tuning is not None:
+        sqlite_tuning.dispose()
+    tts_job_queue.start()
+    logger.info(f"Worker {os.getpid()} ready with {threads} math thread(s)")
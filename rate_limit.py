@@ -0,0 +1,167 @@
+import math
+import time
+import threading
+from functools import wraps
+from flask import jsonify
+from flask_login import current_user
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class EndpointLimit:
+    """Limits for one endpoint: a token bucket per user plus caps on requests in flight.
+
+    `capacity` is the burst size and `refill_rate` the sustained cost units
+    per second, per user. `max_in_flight` caps one user's concurrent requests
+    and `max_in_flight_total` all users' together (None means no cap).
+    """
+
+    def __init__(self, capacity, refill_rate, max_in_flight=2, max_in_flight_total=None):
+        # A bucket that never refills would have no meaningful Retry-After
+        if capacity <= 0 or refill_rate <= 0:
+            raise ValueError("Rate limit capacity and refill rate must be positive")
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_total = max_in_flight_total
+
+
+class TokenBucket:
+    def __init__(self, capacity, refill_rate, now):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def try_consume(self, cost, now):
+        """Take cost tokens, or return how many seconds until they will be available."""
+        self.refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.refill_rate
+
+
+class RateLimiter:
+    """In-process, per-user and per-endpoint rate limiting with in-flight caps.
+
+    State lives in this process only, so with several server processes the
+    effective limits are multiplied by the number of processes.
+    """
+
+    # Buckets that are full and idle are dropped once more than this many users are tracked
+    MAX_TRACKED = 10000
+
+    def __init__(self, limits):
+        self.limits = limits
+        self._buckets = {}      # (user_id, endpoint) -> TokenBucket
+        self._in_flight = {}    # (user_id, endpoint) -> count
+        self._in_flight_total = {endpoint: 0 for endpoint in limits}
+        self._counters = {endpoint: {'allowed': 0, 'rejected_rate': 0, 'rejected_concurrency': 0} for endpoint in limits}
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id, endpoint, cost):
+        """Admit a request or raise RateLimitExceeded; admitted requests must be released."""
+        limit = self.limits[endpoint]
+        key = (user_id, endpoint)
+        # A single request larger than the bucket drains it completely rather than never fitting
+        cost = min(max(cost, 1.0), limit.capacity)
+        now = time.monotonic()
+        with self._lock:
+            counters = self._counters[endpoint]
+            if self._in_flight.get(key, 0) >= limit.max_in_flight or (
+                    limit.max_in_flight_total is not None and
+                    self._in_flight_total[endpoint] >= limit.max_in_flight_total):
+                counters['rejected_concurrency'] += 1
+                raise RateLimitExceeded('Too many requests in progress, please wait for them to finish', 1)
+
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_TRACKED:
+                    self._prune(now)
+                bucket = self._buckets[key] = TokenBucket(limit.capacity, limit.refill_rate, now)
+            wait = bucket.try_consume(cost, now)
+            if wait > 0:
+                counters['rejected_rate'] += 1
+                raise RateLimitExceeded('Rate limit exceeded, please slow down', max(1, math.ceil(wait)))
+
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            self._in_flight_total[endpoint] += 1
+            counters['allowed'] += 1
+
+    def release(self, user_id, endpoint):
+        key = (user_id, endpoint)
+        with self._lock:
+            self._in_flight[key] -= 1
+            if not self._in_flight[key]:
+                del self._in_flight[key]
+            self._in_flight_total[endpoint] -= 1
+
+    def snapshot(self, user_id=None):
+        """Limiter state: global counters and in-flight totals, plus one user's buckets if given."""
+        now = time.monotonic()
+        with self._lock:
+            state = {
+                'endpoints': {
+                    endpoint: {
+                        'capacity': limit.capacity,
+                        'refill_rate': limit.refill_rate,
+                        'max_in_flight': limit.max_in_flight,
+                        'max_in_flight_total': limit.max_in_flight_total,
+                        'in_flight_total': self._in_flight_total[endpoint],
+                        **self._counters[endpoint],
+                    } for endpoint, limit in self.limits.items()
+                },
+                'tracked_buckets': len(self._buckets),
+            }
+            if user_id is not None:
+                state['user'] = {}
+                for endpoint, limit in self.limits.items():
+                    bucket = self._buckets.get((user_id, endpoint))
+                    if bucket is not None:
+                        bucket.refill(now)
+                    state['user'][endpoint] = {
+                        'tokens': bucket.tokens if bucket is not None else limit.capacity,
+                        'in_flight': self._in_flight.get((user_id, endpoint), 0),
+                    }
+        return state
+
+    def _prune(self, now):
+        for key, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity and key not in self._in_flight:
+                del self._buckets[key]
+
+
+def rate_limited(limiter, endpoint, cost_fn):
+    """Decorator for a login-protected view that charges cost_fn() to the current user first.
+
+    Runs before the view touches the request body, so rejected requests cost
+    no image decoding or text processing. Rejections are 429 responses with a
+    Retry-After header.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            user_id = current_user.id
+            try:
+                limiter.acquire(user_id, endpoint, cost_fn())
+            except RateLimitExceeded as e:
+                response = jsonify({'error': str(e), 'retry_after': e.retry_after})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+            try:
+                return f(*args, **kwargs)
+            finally:
+                limiter.release(user_id, endpoint)
+        return wrapper
+    return decorator
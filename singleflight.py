@@ -0,0 +1,72 @@
+import threading
+
+
+class SingleFlightTimeout(TimeoutError):
+    """A coalesced caller gave up waiting for the in-flight call it joined."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the function. Callers that
+    arrive while it runs wait for it and get the same result, or the same
+    exception re-raised. Nothing is cached: once the call finishes, the next
+    caller with that key starts a new execution. Only followers time out; the
+    leader always runs to completion so that the others can still use its
+    result.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {'executions': 0, 'coalesced': 0, 'errors': 0, 'timeouts': 0}
+
+    def do(self, key, fn, timeout=None):
+        """Return (result, coalesced) where coalesced is True if another caller's execution was reused."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self._counters['executions'] += 1
+            else:
+                leader = False
+                call.waiters += 1
+                self._counters['coalesced'] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                with self._lock:
+                    self._counters['errors'] += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result, False
+
+        if not call.done.wait(timeout):
+            with self._lock:
+                self._counters['timeouts'] += 1
+            raise SingleFlightTimeout(f"Timed out after {timeout}s waiting for an identical request in progress")
+        if call.error is not None:
+            raise call.error
+        return call.result, True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._calls)
+            stats['waiting'] = sum(call.waiters for call in self._calls.values())
+        return stats
@@ -142,7 +142,7 @@ function TextToSpeech() {
       // Convert base64 audio to blob URL
       const audioBlob = new Blob(
         [new Uint8Array([...atob(data.audio)].map(char => char.charCodeAt(0)))],
-        { type: 'audio/wav' }
+        { type: data.mime_type || 'audio/wav' }
       );
       const url = URL.createObjectURL(audioBlob);
       setAudioUrl(url);
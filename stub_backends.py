@@ -0,0 +1,137 @@
+import os
+import time
+import random
+import hashlib
+import logging
+import numpy as np
+from audio_encoding import StreamingEncoder, DEFAULT_AUDIO_FORMAT
+
+logger = logging.getLogger(__name__)
+
+STUB_SAMPLE_RATE = 24000
+STUB_FEATURE_DIM = 128
+
+
+def _simulate_latency(latency, jitter):
+    """Sleep for latency seconds, +/- a uniform jitter."""
+    delay = latency + random.uniform(-jitter, jitter)
+    if delay > 0:
+        time.sleep(delay)
+
+
+class StubTTSManager:
+    """Drop-in replacement for TTSManager that synthesizes a tone instead of running Kokoro.
+
+    Latency is `latency + per_char * len(text)` seconds (plus jitter), so long
+    texts hold a worker proportionally longer, like the real model.
+    """
+
+    sample_rate = STUB_SAMPLE_RATE
+
+    def __init__(self, latency=0.5, jitter=0.1, per_char=0.002):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_char = per_char
+        logger.info(f"Using stub TTS backend (latency={latency}s, jitter={jitter}s, per_char={per_char}s)")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=float(os.getenv('STUB_TTS_LATENCY', '0.5')),
+            jitter=float(os.getenv('STUB_TTS_JITTER', '0.1')),
+            per_char=float(os.getenv('STUB_TTS_PER_CHAR', '0.002')),
+        )
+
+    def is_available(self):
+        return True
+
+    def synthesize(self, text, voice='af_heart'):
+        """Return a sine tone roughly as long as the spoken text would be."""
+        _simulate_latency(self.latency + self.per_char * len(text), self.jitter)
+
+        duration = max(0.5, len(text) * 0.06)
+        t = np.arange(int(duration * STUB_SAMPLE_RATE)) / STUB_SAMPLE_RATE
+        return (0.1 * np.sin(2 * np.pi * 220.0 * t)).astype(np.float32)
+
+    def iter_audio(self, text, voice='af_heart'):
+        yield self.synthesize(text, voice=voice)
+
+    def generate_speech(self, text, output_path, voice='af_heart', audio_format=DEFAULT_AUDIO_FORMAT,
+                        sample_rate=None, compression_level=None, bitrate_mode=None):
+        with StreamingEncoder(output_path, audio_format, input_rate=self.sample_rate, sample_rate=sample_rate,
+                              compression_level=compression_level, bitrate_mode=bitrate_mode) as encoder:
+            for audio_chunk in self.iter_audio(text, voice=voice):
+                encoder.write(audio_chunk)
+        stats = encoder.stats
+        stats['bytes'] = os.path.getsize(output_path)
+        return stats
+
+
+class StubFaceDetector:
+    """Stands in for cv2.FaceDetectorYN and reports one centered face per image."""
+
+    def __init__(self, latency=0.05, jitter=0.01):
+        self.latency = latency
+        self.jitter = jitter
+        self.input_size = (320, 320)
+
+    def setInputSize(self, size):
+        self.input_size = tuple(size)
+
+    def detect(self, image):
+        _simulate_latency(self.latency, self.jitter)
+
+        width, height = self.input_size
+        w, h = width * 0.4, height * 0.5
+        x, y = (width - w) / 2, (height - h) / 2
+        # YuNet row layout: box (4), five landmarks (10), score (1)
+        landmarks = [
+            x + w * 0.3, y + h * 0.4, x + w * 0.7, y + h * 0.4,
+            x + w * 0.5, y + h * 0.6,
+            x + w * 0.35, y + h * 0.8, x + w * 0.65, y + h * 0.8,
+        ]
+        face = np.array([[x, y, w, h, *landmarks, 0.99]], dtype=np.float32)
+        return 1, face
+
+
+class StubFaceRecognizer:
+    """Stands in for cv2.FaceRecognizerSF with deterministic content-derived features."""
+
+    def __init__(self, latency=0.02, jitter=0.005):
+        self.latency = latency
+        self.jitter = jitter
+
+    def alignCrop(self, image, face):
+        x, y, w, h = [int(v) for v in face[:4]]
+        crop = image[max(y, 0):y + h, max(x, 0):x + w]
+        return crop if crop.size else image
+
+    def feature(self, aligned):
+        _simulate_latency(self.latency, self.jitter)
+
+        # Seed from a coarse summary of the crop so the same photo gives the same features
+        digest = hashlib.sha1(np.ascontiguousarray(aligned[::8, ::8]).tobytes()).digest()
+        rng = np.random.default_rng(int.from_bytes(digest[:8], 'little'))
+        return rng.standard_normal((1, STUB_FEATURE_DIM)).astype(np.float32)
+
+    def match(self, face_feature1, face_feature2, dis_type=0):
+        f1 = face_feature1.ravel() / np.linalg.norm(face_feature1)
+        f2 = face_feature2.ravel() / np.linalg.norm(face_feature2)
+        # Same constants as cv2.FACE_RECOGNIZER_SF_FR_COSINE (0) and FR_NORM_L2 (1)
+        if dis_type == 0:
+            return float(np.dot(f1, f2))
+        return float(np.linalg.norm(f1 - f2))
+
+
+def create_face_models_from_env():
+    """Build the stub detector/recognizer pair using STUB_FACE_* environment variables."""
+    detector = StubFaceDetector(
+        latency=float(os.getenv('STUB_FACE_DETECT_LATENCY', '0.05')),
+        jitter=float(os.getenv('STUB_FACE_JITTER', '0.01')),
+    )
+    recognizer = StubFaceRecognizer(
+        latency=float(os.getenv('STUB_FACE_FEATURE_LATENCY', '0.02')),
+        jitter=float(os.getenv('STUB_FACE_JITTER', '0.01')) / 2,
+    )
+    logger.info(f"Using stub face backends (detect={detector.latency}s, feature={recognizer.latency}s)")
+    return detector, recognizer
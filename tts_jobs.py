@@ -0,0 +1,250 @@
+import os
+import json
+import uuid
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timedelta
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+MAX_JOB_TEXT_LENGTH = 200000
+
+
+def _process_alive(pid):
+    """Whether a process with this pid exists on this host."""
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class TTSJobQueue:
+    """Persistent queue of long-running TTS jobs, drained by a pool of worker threads.
+
+    Jobs live in the database (`job_model`) and their audio on disk under
+    `jobs_dir`, so both survive restarts. Workers claim one segment at a time,
+    always picking the queued job whose owner has the fewest segments in
+    progress (and was served least recently), so one user's large backlog
+    cannot starve other users. A claim is an atomic status update, which keeps
+    this safe when several server processes share the database.
+    """
+
+    def __init__(self, app, db, job_model, tts_manager, jobs_dir, workers=1,
+                 poll_interval=2.0, stale_after=300, on_segment=None):
+        self.app = app
+        self.db = db
+        self.Job = job_model
+        self.tts_manager = tts_manager
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.on_segment = on_segment  # called with (segment_text, seconds) after each synthesized segment
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._last_served = {}
+
+    def start(self):
+        """Start the worker threads for this process (again after a fork)."""
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            os.makedirs(self.jobs_dir, exist_ok=True)
+            with self.app.app_context():
+                self._requeue_stale()
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'tts-job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"Started {self.workers} TTS job worker(s) in process {self._pid}")
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def submit(self, user_id, text, voice, segments):
+        """Queue a job for text already split into segments (the TTS planner's chunks)."""
+        if not segments:
+            raise ValueError("No text provided")
+        job = self.Job(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            voice=voice,
+            text=text,
+            segments=json.dumps(segments),
+            segments_total=len(segments),
+            segments_done=0,
+            status='queued',
+            updated_at=datetime.utcnow(),
+        )
+        self.db.session.add(job)
+        self.db.session.commit()
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def result_path(self, job_id):
+        return os.path.join(self.job_dir(job_id), 'result.wav')
+
+    def _segment_path(self, job_id, index):
+        return os.path.join(self.job_dir(job_id), f'segment_{index:05d}.wav')
+
+    def to_dict(self, job):
+        # A job between segment claims is back in the queue, but to the client it is running
+        status = 'running' if job.status == 'queued' and job.segments_done else job.status
+        return {
+            'id': job.id,
+            'status': status,
+            'voice': job.voice,
+            'segments_total': job.segments_total,
+            'segments_done': job.segments_done,
+            'progress': job.segments_done / job.segments_total if job.segments_total else 0.0,
+            'error': job.error,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    try:
+                        job_id = self._claim_next()
+                        if job_id is None:
+                            self._requeue_stale()
+                        else:
+                            self._run_segment(job_id)
+                    finally:
+                        self.db.session.remove()
+            except Exception as e:
+                logger.error(f"TTS job worker error: {str(e)}")
+                job_id = None
+            if job_id is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _claim_next(self):
+        Job = self.Job
+        in_progress = dict(
+            self.db.session.query(Job.user_id, self.db.func.count(Job.id))
+            .filter(Job.status == 'running').group_by(Job.user_id).all()
+        )
+        # Only each user's oldest queued job is a candidate, so one user's backlog cannot crowd out the others
+        oldest = (
+            self.db.session.query(Job.user_id, self.db.func.min(Job.created_at).label('created_at'))
+            .filter(Job.status == 'queued').group_by(Job.user_id).subquery()
+        )
+        queued = (
+            Job.query.join(oldest, (Job.user_id == oldest.c.user_id) & (Job.created_at == oldest.c.created_at))
+            .filter(Job.status == 'queued').order_by(Job.created_at).all()
+        )
+        queued.sort(key=lambda job: (
+            in_progress.get(job.user_id, 0), self._last_served.get(job.user_id, 0.0),
+        ))  # stable sort keeps oldest-first among equally served users
+
+        for job in queued:
+            claimed = Job.query.filter_by(id=job.id, status='queued').update(
+                {'status': 'running', 'claimed_by': os.getpid(), 'updated_at': datetime.utcnow()},
+                synchronize_session=False,
+            )
+            self.db.session.commit()
+            if claimed:
+                self._last_served[job.user_id] = time.monotonic()
+                return job.id
+        return None
+
+    def _run_segment(self, job_id):
+        job = self.db.session.get(self.Job, job_id)
+        index = job.segments_done
+        segments = json.loads(job.segments)
+        try:
+            os.makedirs(self.job_dir(job_id), exist_ok=True)
+            if index < len(segments):
+                started = time.perf_counter()
+                audio = self.tts_manager.synthesize(segments[index], voice=job.voice)
+                if self.on_segment is not None:
+                    self.on_segment(segments[index], time.perf_counter() - started)
+                sf.write(self._segment_path(job_id, index), audio, self.tts_manager.sample_rate)
+                index += 1
+
+            if index >= len(segments):
+                self._assemble(job_id, len(segments))
+                job.status = 'completed'
+                job.finished_at = datetime.utcnow()
+            else:
+                job.status = 'queued'
+            job.claimed_by = None
+            job.segments_done = index
+            job.updated_at = datetime.utcnow()
+            self.db.session.commit()
+            logger.info(f"TTS job {job_id}: segment {index}/{len(segments)} done")
+        except Exception as e:
+            logger.error(f"TTS job {job_id} failed on segment {index}: {str(e)}")
+            self.db.session.rollback()
+            job = self.db.session.get(self.Job, job_id)
+            if job is None:  # deleted while the segment was running
+                return
+            job.status = 'failed'
+            job.claimed_by = None
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            job.updated_at = datetime.utcnow()
+            self.db.session.commit()
+        self._wakeup.set()
+
+    def _assemble(self, job_id, count):
+        """Concatenate the per-segment files into the final result, one segment in memory at a time."""
+        partial_path = self.result_path(job_id) + '.part'
+        with sf.SoundFile(partial_path, 'w', samplerate=self.tts_manager.sample_rate, channels=1,
+                          format='WAV', subtype='PCM_16') as out:
+            for index in range(count):
+                data, _ = sf.read(self._segment_path(job_id, index), dtype='float32')
+                out.write(data)
+        os.replace(partial_path, self.result_path(job_id))
+        for index in range(count):
+            os.remove(self._segment_path(job_id, index))
+
+    def _requeue_stale(self):
+        """Put back jobs whose worker process died, or that have not made progress in stale_after seconds."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        requeued = 0
+        for job in self.Job.query.filter_by(status='running').all():
+            if job.updated_at and job.updated_at >= cutoff and _process_alive(job.claimed_by):
+                continue
+            requeued += self.Job.query.filter_by(id=job.id, status='running').update(
+                {'status': 'queued', 'claimed_by': None}, synchronize_session=False
+            )
+        self.db.session.commit()
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted TTS job(s)")
+
+    def delete(self, job_id):
+        """Delete a job unless a worker is running it; returns False if it is running (or gone).
+
+        The status check and the delete are one statement, so a worker cannot
+        claim the job in between and write into a removed directory.
+        """
+        deleted = self.Job.query.filter(
+            self.Job.id == job_id, self.Job.status.in_(('queued', 'completed', 'failed'))
+        ).delete(synchronize_session=False)
+        self.db.session.commit()
+        if deleted:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        return bool(deleted)
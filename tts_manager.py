@@ -5,6 +5,7 @@ import torch
 import numpy as np
 from kokoro import KPipeline
 from pathlib import Path
+from audio_encoding import StreamingEncoder, DEFAULT_AUDIO_FORMAT
 
 # Set up logging
 logging.basicConfig(
@@ -13,9 +14,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Kokoro produces 24 kHz mono audio
+SAMPLE_RATE = 24000
+
 class TTSManager:
-    def __init__(self):
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self, bundle=None):
         self.pipeline = None
+        self.bundle = bundle
         self.initialize()
     
     def initialize(self):
@@ -23,14 +30,23 @@ class TTSManager:
         try:
             logger.info("Initializing TTS manager with Kokoro...")
             
-            # Initialize the pipeline with explicit model path
-            model_path = os.path.join(os.path.expanduser("~"), ".cache", "huggingface", "hub", "models--hexgrad--Kokoro-82M")
-            logger.info(f"Using model path: {model_path}")
-            
-            self.pipeline = KPipeline(
-                lang_code='a',
-                repo_id='hexgrad/Kokoro-82M'
-            )
+            if self.bundle is not None:
+                # Load everything from the local model bundle (app.py sets HF_HUB_OFFLINE before kokoro is imported)
+                logger.info(f"Using model bundle {self.bundle.version} at {self.bundle.path}")
+                self.pipeline = KPipeline(
+                    lang_code='a',
+                    repo_id=self.bundle.repo_id,
+                    model=self.bundle.load_kokoro_model()
+                )
+            else:
+                # Initialize the pipeline with explicit model path
+                model_path = os.path.join(os.path.expanduser("~"), ".cache", "huggingface", "hub", "models--hexgrad--Kokoro-82M")
+                logger.info(f"Using model path: {model_path}")
+                
+                self.pipeline = KPipeline(
+                    lang_code='a',
+                    repo_id='hexgrad/Kokoro-82M'
+                )
             logger.info("Successfully initialized Kokoro TTS pipeline")
             
             # Test the pipeline
@@ -40,6 +56,15 @@ class TTSManager:
             logger.error(f"Failed to initialize TTS manager: {str(e)}")
             self.pipeline = None
     
+    def _resolve_voice(self, voice):
+        """Map a voice name to its bundled .pt file when running from a model bundle."""
+        if self.bundle is not None:
+            voice_path = self.bundle.voice_path(voice)
+            if voice_path is None:
+                raise Exception(f"Voice '{voice}' is not in the model bundle (available: {', '.join(self.bundle.voices)})")
+            return voice_path
+        return voice
+    
     def _process_audio_chunk(self, audio_chunk):
         """Process an audio chunk and convert it to numpy array."""
         try:
@@ -65,7 +90,7 @@ class TTSManager:
             logger.info(f"Generating test audio for text: {test_text}")
             
             # Generate test audio
-            generator = self.pipeline(test_text, voice='af_heart')
+            generator = self.pipeline(test_text, voice=self._resolve_voice(self.bundle.voices[0] if self.bundle else 'af_heart'))
             audio_chunks = []
             
             # Collect all audio chunks
@@ -82,7 +107,7 @@ class TTSManager:
                 full_audio = np.concatenate(audio_chunks)
                 logger.info(f"Concatenated audio shape: {full_audio.shape}")
                 
-                sf.write(test_file, full_audio, 24000)
+                sf.write(test_file, full_audio, self.sample_rate)
                 logger.info(f"Saved test audio to {test_file}")
                 
                 if os.path.exists(test_file):
@@ -104,39 +129,66 @@ class TTSManager:
         """Check if TTS is available and working."""
         return self.pipeline is not None
     
-    def generate_speech(self, text, output_path, voice='af_heart'):
-        """Generate speech from text and save to file."""
+    def count_phonemes(self, text):
+        """Number of phonemes Kokoro's G2P produces for text, used to estimate synthesis cost."""
+        if not self.is_available():
+            return None
+        phonemes, _ = self.pipeline.g2p(text)
+        return len(phonemes.replace(' ', ''))
+    
+    def iter_audio(self, text, voice='af_heart'):
+        """Yield float32 audio chunks at SAMPLE_RATE as the pipeline produces them."""
+        if not self.is_available():
+            raise Exception("TTS model is not available")
+        
+        # Generate audio using the pipeline
+        generator = self.pipeline(text, voice=self._resolve_voice(voice))
+        
+        for i, (gs, ps, audio_chunk) in enumerate(generator):
+            logger.debug(f"Processing chunk {i}: gs={gs}, ps={ps}")
+            processed_chunk = self._process_audio_chunk(audio_chunk)
+            if processed_chunk is not None:
+                logger.debug(f"Yielding audio chunk of shape {processed_chunk.shape}")
+                yield processed_chunk
+    
+    def synthesize(self, text, voice='af_heart'):
+        """Generate speech from text and return it as a float32 array at SAMPLE_RATE."""
+        audio_chunks = list(self.iter_audio(text, voice=voice))
+        
+        if not audio_chunks:
+            raise Exception("TTS generation produced no audio chunks")
+        
+        logger.info(f"Collected {len(audio_chunks)} audio chunks")
+        
+        # Concatenate chunks
+        full_audio = np.concatenate(audio_chunks)
+        logger.info(f"Concatenated audio shape: {full_audio.shape}")
+        return full_audio
+    
+    def generate_speech(self, text, output_path, voice='af_heart', audio_format=DEFAULT_AUDIO_FORMAT,
+                        sample_rate=None, compression_level=None, bitrate_mode=None):
+        """Generate speech from text and encode it to output_path as chunks arrive.
+        
+        Returns the encoder stats (format, MIME type, sample rate, audio and encode seconds).
+        """
         if not self.is_available():
             raise Exception("TTS model is not available")
         
         try:
             logger.info(f"Generating speech for text: {text[:50]}...")
-            logger.info(f"Using voice: {voice}")
-            
-            # Generate audio using the pipeline
-            generator = self.pipeline(text, voice=voice)
-            audio_chunks = []
-            
-            # Collect all audio chunks
-            for i, (gs, ps, audio_chunk) in enumerate(generator):
-                logger.debug(f"Processing chunk {i}: gs={gs}, ps={ps}")
-                processed_chunk = self._process_audio_chunk(audio_chunk)
-                if processed_chunk is not None:
-                    audio_chunks.append(processed_chunk)
-                    logger.debug(f"Added audio chunk of shape {processed_chunk.shape}")
-            
-            if not audio_chunks:
-                raise Exception("TTS generation produced no audio chunks")
-            
-            logger.info(f"Collected {len(audio_chunks)} audio chunks")
+            logger.info(f"Using voice: {voice}, format: {audio_format}")
             
-            # Concatenate chunks and save
-            full_audio = np.concatenate(audio_chunks)
-            logger.info(f"Concatenated audio shape: {full_audio.shape}")
+            with StreamingEncoder(output_path, audio_format, input_rate=self.sample_rate, sample_rate=sample_rate,
+                                  compression_level=compression_level, bitrate_mode=bitrate_mode) as encoder:
+                for audio_chunk in self.iter_audio(text, voice=voice):
+                    encoder.write(audio_chunk)
+                if not encoder.samples_written:
+                    raise Exception("TTS generation produced no audio chunks")
             
-            sf.write(output_path, full_audio, 24000)
-            logger.info(f"Successfully generated speech and saved to: {output_path}")
-            return True
+            stats = encoder.stats
+            stats['bytes'] = os.path.getsize(output_path)
+            logger.info(f"Successfully generated speech and saved to: {output_path} ({stats})")
+            return stats
             
         except Exception as e:
             logger.error(f"Failed to generate speech: {str(e)}")
@@ -0,0 +1,266 @@
+import re
+import math
+import time
+import logging
+import threading
+import unicodedata
+from collections import deque, defaultdict
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+|\n+')
+_CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b-\x1f\x7f-\x9f]')
+_LETTERS = re.compile(r'[^\W\d_]')
+_DIGITS = re.compile(r'\d')
+
+# Rough phonemes per letter/digit for English when no G2P is available
+PHONEMES_PER_LETTER = 0.8
+PHONEMES_PER_DIGIT = 3.0
+
+
+class AdmissionError(Exception):
+    """A TTS request was refused before synthesis.
+
+    `status_code` is 413 when the request alone is over budget and 429 when
+    the user's budget for the current window is used up; `retry_after` is
+    then the number of seconds until enough budget frees up.
+    """
+
+    def __init__(self, message, status_code, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def normalize_text(text):
+    """NFKC-normalize, strip control characters and collapse runs of spaces (newlines are kept)."""
+    text = unicodedata.normalize('NFKC', text)
+    text = _CONTROL_CHARS.sub(' ', text)
+    lines = (' '.join(line.split()) for line in text.splitlines())
+    return '\n'.join(line for line in lines if line).strip()
+
+
+def split_sentences(text, max_chars=400):
+    """Split at sentence ends and newlines; overlong sentences are broken at word boundaries."""
+    sentences = []
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip() if sentence else ''
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            sentences.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def estimate_phonemes(text):
+    """Character-based phoneme estimate, used when no phonemizer is available."""
+    return int(len(_LETTERS.findall(text)) * PHONEMES_PER_LETTER + len(_DIGITS.findall(text)) * PHONEMES_PER_DIGIT) + 1
+
+
+class CostEstimator:
+    """Predicts synthesis seconds as `seconds_per_phoneme * phonemes + seconds_per_chunk * chunks`.
+
+    Every recorded (phonemes, chunks, actual seconds) observation moves
+    seconds_per_phoneme towards the observed rate by an exponential moving
+    average, so the estimate calibrates itself to the hardware it runs on.
+    """
+
+    def __init__(self, seconds_per_phoneme=0.015, seconds_per_chunk=0.05, smoothing=0.1, history=200):
+        self.seconds_per_phoneme = seconds_per_phoneme
+        self.seconds_per_chunk = seconds_per_chunk
+        self.smoothing = smoothing
+        self.samples = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def estimate(self, phonemes, chunks=1):
+        return self.seconds_per_phoneme * phonemes + self.seconds_per_chunk * chunks
+
+    def record(self, phonemes, chunks, actual_seconds, predicted_seconds=None):
+        if phonemes <= 0 or actual_seconds <= 0:
+            return
+        with self._lock:
+            if predicted_seconds is None:
+                predicted_seconds = self.estimate(phonemes, chunks)
+            observed_rate = max(actual_seconds - self.seconds_per_chunk * chunks, 0.0) / phonemes
+            self.seconds_per_phoneme += self.smoothing * (observed_rate - self.seconds_per_phoneme)
+            self.samples.append((predicted_seconds, actual_seconds))
+
+    def stats(self):
+        with self._lock:
+            samples = list(self.samples)
+        errors = [abs(actual - predicted) / actual for predicted, actual in samples if actual > 0]
+        return {
+            'seconds_per_phoneme': self.seconds_per_phoneme,
+            'seconds_per_chunk': self.seconds_per_chunk,
+            'samples': len(samples),
+            'mean_abs_pct_error': sum(errors) / len(errors) if errors else None,
+            'recent': [{'predicted': round(p, 3), 'actual': round(a, 3)} for p, a in samples[-5:]],
+        }
+
+
+class TTSPlan:
+    def __init__(self, user_id, text, chunks, chunk_phonemes, predicted_seconds):
+        self.user_id = user_id
+        self.text = text
+        self.chunks = chunks
+        self.chunk_phonemes = chunk_phonemes
+        self.phonemes = sum(chunk_phonemes)
+        self.predicted_seconds = predicted_seconds
+        self._ledger_entry = None
+
+
+class TTSPlanner:
+    """Admission control and chunk planning for TTS requests.
+
+    A request is normalized and its synthesis cost estimated, then checked
+    against a per-request limit and against each user's total for a sliding
+    window. Admitted text is split into sentence-aligned chunks of balanced
+    cost. Text whose character-based estimate is already well over the limit
+    is refused before it reaches the (much slower) phonemizer.
+    """
+
+    # The character-based estimate may be this much over the limit before a request is refused unphonemized
+    ESTIMATE_SLACK = 1.25
+
+    def __init__(self, phonemizer=None, estimator=None, max_request_seconds=60.0, user_budget_seconds=3600.0,
+                 budget_window=3600.0, target_chunk_phonemes=300, max_chars=200000):
+        self.phonemizer = phonemizer
+        self.estimator = estimator or CostEstimator()
+        self.max_request_seconds = max_request_seconds
+        self.user_budget_seconds = user_budget_seconds
+        self.budget_window = budget_window
+        self.target_chunk_phonemes = target_chunk_phonemes
+        self.max_chars = max_chars
+        self._ledger = defaultdict(deque)  # user_id -> deque of [timestamp, seconds]
+        self._lock = threading.Lock()
+
+    def count_phonemes(self, text):
+        if self.phonemizer is not None:
+            try:
+                count = self.phonemizer(text)
+                if count:
+                    return count
+            except Exception as e:
+                logger.warning(f"Phonemizer failed, falling back to estimate: {str(e)}")
+        return estimate_phonemes(text)
+
+    def plan(self, user_id, text, max_request_seconds=None, max_chars=None, phonemize=True):
+        """Normalize, cost and chunk text, charging its predicted cost to the user.
+
+        With phonemize=False only the character-based estimate is used, e.g.
+        for background jobs whose segments are phonemized by the worker.
+        Raises AdmissionError if the request or the user is over budget.
+        """
+        limit = max_request_seconds if max_request_seconds is not None else self.max_request_seconds
+        max_chars = max_chars if max_chars is not None else self.max_chars
+        text = normalize_text(text)
+        # Cheap bounds before doing any phonemization work
+        if len(text) > max_chars:
+            raise AdmissionError(f'Text is too long (maximum {max_chars} characters)', 413)
+
+        sentences = split_sentences(text)
+        counts = [estimate_phonemes(sentence) for sentence in sentences]
+        self._check_limit(self.estimator.estimate(sum(counts), len(sentences)), limit,
+                          slack=self.ESTIMATE_SLACK if phonemize and self.phonemizer is not None else 1.0)
+
+        if phonemize and self.phonemizer is not None:
+            counts = [self.count_phonemes(sentence) for sentence in sentences]
+        chunks, chunk_phonemes = self._balance(sentences, counts)
+        predicted = self.estimator.estimate(sum(chunk_phonemes), len(chunks))
+        self._check_limit(predicted, limit)
+
+        plan = TTSPlan(user_id, text, chunks, chunk_phonemes, predicted)
+        self._charge(plan)
+        return plan
+
+    def record(self, plan, actual_seconds):
+        """Feed the actual synthesis time back into the estimator and the user's ledger."""
+        self.estimator.record(plan.phonemes, len(plan.chunks), actual_seconds, plan.predicted_seconds)
+        if plan._ledger_entry is not None:
+            with self._lock:
+                plan._ledger_entry[1] = actual_seconds
+        logger.info(f"TTS cost for user {plan.user_id}: predicted {plan.predicted_seconds:.2f}s, "
+                    f"actual {actual_seconds:.2f}s ({plan.phonemes} phonemes, {len(plan.chunks)} chunks)")
+
+    def record_chunk(self, text, actual_seconds):
+        """Calibrate from a single synthesized chunk that was charged as part of an earlier plan."""
+        self.estimator.record(self.count_phonemes(text), 1, actual_seconds)
+
+    def refund(self, plan):
+        """Return a plan's charge to the user, e.g. when synthesis failed before starting."""
+        if plan._ledger_entry is not None:
+            with self._lock:
+                plan._ledger_entry[1] = 0.0
+
+    def usage(self, user_id):
+        with self._lock:
+            ledger = self._ledger[user_id]
+            self._expire(ledger, time.monotonic())
+            return sum(seconds for _, seconds in ledger)
+
+    def stats(self):
+        stats = self.estimator.stats()
+        stats.update({
+            'max_request_seconds': self.max_request_seconds,
+            'user_budget_seconds': self.user_budget_seconds,
+            'budget_window': self.budget_window,
+        })
+        return stats
+
+    def _check_limit(self, predicted, limit, slack=1.0):
+        if predicted > limit * slack:
+            raise AdmissionError(
+                f'Text would take about {predicted:.0f}s to synthesize, over the {limit:.0f}s limit per request', 413
+            )
+
+    def _expire(self, ledger, now):
+        while ledger and ledger[0][0] <= now - self.budget_window:
+            ledger.popleft()
+
+    def _charge(self, plan):
+        now = time.monotonic()
+        with self._lock:
+            ledger = self._ledger[plan.user_id]
+            self._expire(ledger, now)
+            used = sum(seconds for _, seconds in ledger)
+            if used + plan.predicted_seconds > self.user_budget_seconds:
+                # Wait until enough of the oldest charges leave the window
+                needed = used + plan.predicted_seconds - self.user_budget_seconds
+                retry_after, freed = self.budget_window, 0.0
+                for timestamp, seconds in ledger:
+                    freed += seconds
+                    if freed >= needed:
+                        retry_after = timestamp + self.budget_window - now
+                        break
+                raise AdmissionError('TTS usage budget exceeded, please try again later', 429,
+                                     retry_after=max(1, math.ceil(retry_after)))
+            entry = [now, plan.predicted_seconds]
+            ledger.append(entry)
+            plan._ledger_entry = entry
+
+    def _balance(self, sentences, counts):
+        """Group consecutive sentences into chunks of roughly equal phoneme count."""
+        total = sum(counts)
+        if not sentences:
+            return [], []
+        remaining_chunks = max(1, math.ceil(total / self.target_chunk_phonemes))
+        chunks, chunk_phonemes = [], []
+        current, current_count, remaining = [], 0, total
+        for sentence, count in zip(sentences, counts):
+            target = remaining / remaining_chunks
+            # Close the chunk if adding this sentence overshoots the target more than stopping short does
+            if current and remaining_chunks > 1 and current_count + count - target > target - current_count:
+                chunks.append(' '.join(current))
+                chunk_phonemes.append(current_count)
+                remaining -= current_count
+                remaining_chunks -= 1
+                current, current_count = [], 0
+            current.append(sentence)
+            current_count += count
+        chunks.append(' '.join(current))
+        chunk_phonemes.append(current_count)
+        return chunks, chunk_phonemes
@@ -0,0 +1,192 @@
+import time
+import logging
+import numpy as np
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0.0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0.0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class _Track:
+    def __init__(self, track_id, box, frame_index, timestamp):
+        self.id = track_id
+        self.box = box
+        self.first_frame = frame_index
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.scores = None
+        self.is_match = False
+
+
+class VideoFaceSearch:
+    """Find a reference face in a video without running the models on every frame.
+
+    YuNet runs only on keyframes: every `detect_every` frames, and whenever
+    the grayscale histogram changes sharply (a scene cut). Between keyframes
+    each face box is moved along with the median Lucas-Kanade optical flow of
+    corner points inside it. At a keyframe, detections are matched to the
+    propagated boxes by IoU. Only detections that start a new track are
+    embedded with SFace and compared with the reference, once per track.
+    """
+
+    def __init__(self, detect_fn, embed_fn, match_fn, detect_every=10, scene_threshold=0.4,
+                 iou_threshold=0.3, max_width=640):
+        self.detect_fn = detect_fn  # image -> (retval, faces) as from FaceDetectorYN.detect
+        self.embed_fn = embed_fn    # (image, face_row) -> features
+        self.match_fn = match_fn    # (features1, features2) -> {'l2_score', 'cosine_score'}
+        self.detect_every = max(1, int(detect_every))
+        self.scene_threshold = scene_threshold
+        self.iou_threshold = iou_threshold
+        self.max_width = max_width
+
+    def search(self, video_path, reference_features, l2_threshold, cosine_threshold, max_frames=None):
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise ValueError("Could not open video")
+
+        video_fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        tracks, finished = [], []
+        next_track_id = 0
+        prev_gray, prev_hist = None, None
+        since_detect = self.detect_every
+        stats = {'frames': 0, 'detections_run': 0, 'scene_changes': 0, 'embeddings_computed': 0}
+        started = time.perf_counter()
+
+        try:
+            while max_frames is None or stats['frames'] < max_frames:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                frame_index = stats['frames']
+                stats['frames'] += 1
+                timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                if not timestamp and video_fps:
+                    timestamp = frame_index / video_fps
+
+                frame = self._resize(frame)
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                hist = self._histogram(gray)
+
+                scene_change = prev_hist is not None and \
+                    cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL) < 1.0 - self.scene_threshold
+                if scene_change:
+                    stats['scene_changes'] += 1
+                    finished.extend(tracks)
+                    tracks = []
+
+                if scene_change or since_detect >= self.detect_every:
+                    since_detect = 0
+                    stats['detections_run'] += 1
+                    _, faces = self.detect_fn(frame)
+                    detections = [] if faces is None else list(faces)
+
+                    matched, unmatched = self._associate(tracks, detections, timestamp)
+                    # Tracks that found no detection have left the frame
+                    finished.extend(t for i, t in enumerate(tracks) if i not in matched)
+                    tracks = [t for i, t in enumerate(tracks) if i in matched]
+
+                    for face in unmatched:
+                        track = _Track(next_track_id, tuple(float(v) for v in face[:4]), frame_index, timestamp)
+                        next_track_id += 1
+                        features = self.embed_fn(frame, face)
+                        stats['embeddings_computed'] += 1
+                        if features is not None:
+                            track.scores = self.match_fn(reference_features, features)
+                            track.is_match = track.scores['l2_score'] <= l2_threshold and \
+                                track.scores['cosine_score'] >= cosine_threshold
+                        tracks.append(track)
+                elif tracks and prev_gray is not None:
+                    self._propagate(tracks, prev_gray, gray)
+                    for track in tracks:
+                        track.last_seen = timestamp
+
+                since_detect += 1
+                prev_gray, prev_hist = gray, hist
+        finally:
+            capture.release()
+
+        elapsed = time.perf_counter() - started
+        finished.extend(tracks)
+        matches = [{
+            'track_id': t.id,
+            'start_time': round(t.first_seen, 3),
+            'end_time': round(t.last_seen, 3),
+            'first_frame': t.first_frame,
+            'l2_score': t.scores['l2_score'],
+            'cosine_score': t.scores['cosine_score'],
+        } for t in sorted(finished, key=lambda t: t.first_seen) if t.is_match]
+
+        stats.update({
+            'tracks': next_track_id,
+            'elapsed_seconds': round(elapsed, 3),
+            'processing_fps': round(stats['frames'] / elapsed, 2) if elapsed > 0 else None,
+            'video_fps': video_fps,
+        })
+        logger.info(f"Video face search: {stats}")
+        return {'matches': matches, 'stats': stats}
+
+    def _resize(self, frame):
+        height, width = frame.shape[:2]
+        if width <= self.max_width:
+            return frame
+        scale = self.max_width / width
+        return cv2.resize(frame, (self.max_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def _histogram(gray):
+        small = cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA)
+        hist = cv2.calcHist([small], [0], None, [32], [0, 256])
+        return cv2.normalize(hist, hist)
+
+    def _associate(self, tracks, detections, timestamp):
+        """Greedily pair detections with tracks by IoU.
+
+        Returns the indices of matched tracks and the detections left over.
+        """
+        pairs = sorted(
+            ((_iou(track.box, tuple(face[:4])), ti, di)
+             for ti, track in enumerate(tracks) for di, face in enumerate(detections)),
+            reverse=True,
+        )
+        used_tracks, used_detections = set(), set()
+        for score, ti, di in pairs:
+            if score < self.iou_threshold:
+                break
+            if ti in used_tracks or di in used_detections:
+                continue
+            used_tracks.add(ti)
+            used_detections.add(di)
+            tracks[ti].box = tuple(float(v) for v in detections[di][:4])
+            tracks[ti].last_seen = timestamp
+        return used_tracks, [face for di, face in enumerate(detections) if di not in used_detections]
+
+    @staticmethod
+    def _propagate(tracks, prev_gray, gray):
+        """Shift each track box by the median optical flow of corners found inside it."""
+        height, width = gray.shape[:2]
+        for track in tracks:
+            x, y, w, h = track.box
+            x0, y0 = max(int(x), 0), max(int(y), 0)
+            x1, y1 = min(int(x + w), width), min(int(y + h), height)
+            if x1 - x0 < 8 or y1 - y0 < 8:
+                continue
+            mask = np.zeros_like(prev_gray)
+            mask[y0:y1, x0:x1] = 255
+            points = cv2.goodFeaturesToTrack(prev_gray, maxCorners=20, qualityLevel=0.01, minDistance=3, mask=mask)
+            if points is None:
+                continue
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, winSize=(15, 15), maxLevel=2)
+            good = status.ravel() == 1
+            if good.sum() < 3:
+                continue
+            dx, dy = np.median((moved[good] - points[good]).reshape(-1, 2), axis=0)
+            track.box = (x + float(dx), y + float(dy), w, h)